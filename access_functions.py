@@ -1,11 +1,30 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 from dotenv import load_dotenv
 import shopify
 from google.cloud import bigquery
 from google.cloud.exceptions import NotFound
+from google.oauth2 import service_account
+try:
+    from google.cloud import bigquery_storage
+except ImportError:  # Optional: enables the Storage Read API fast path
+    bigquery_storage = None
 import pandas as pd
 import logging
+import threading
+import asyncio
+import time
+import random
+import functools
+import uuid
+import datetime
+import gzip
+import hashlib
+import json
+import re
+from pathlib import Path
 
 load_dotenv()
 
@@ -16,14 +35,334 @@ API_VERSION = os.getenv("API_VERSION")
 project_id=os.getenv("GCP_PROJECT_ID")
 dataset_id=os.getenv("BIGQUERY_DATASET_ID")
 credentials_path = os.path.join("credentials", "credentials.json")
+HTTP_POOL_SIZE = int(os.getenv("SHOPIFY_HTTP_POOL_SIZE", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("SHOPIFY_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("SHOPIFY_HTTP_READ_TIMEOUT", "300"))
+BIGQUERY_METADATA_TTL = float(os.getenv("BIGQUERY_METADATA_TTL", "300"))
+QUERY_CACHE_DIR = os.getenv("SHOPIFYQL_CACHE_DIR")
+QUERY_CACHE_MAX_MB = float(os.getenv("SHOPIFYQL_CACHE_MAX_MB", "512"))
+QUERY_CACHE_RELATIVE_TTL = float(os.getenv("SHOPIFYQL_CACHE_RELATIVE_TTL", "900"))
+RETRY_MAX_ATTEMPTS = int(os.getenv("SHOPIFY_RETRY_MAX_ATTEMPTS", "6"))
+RETRY_BASE_DELAY = float(os.getenv("SHOPIFY_RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("SHOPIFY_RETRY_MAX_DELAY", "60"))
+RETRY_MAX_ELAPSED = float(os.getenv("SHOPIFY_RETRY_MAX_ELAPSED", "600"))
 logger = logging.getLogger(__name__)
 
-def get_access_token_oauth(shop_url):
+
+class ShopifyHTTPClient:
+    """
+    Shared keep-alive HTTP client for all Shopify calls.
+
+    Wraps a `requests.Session` with a pooled adapter, so every query to the
+    shop reuses an open TLS connection instead of paying a new handshake.
+
+    Args:
+        pool_size: Max connections kept open per host
+        connect_timeout: Seconds to wait for a connection
+        read_timeout: Seconds to wait for a response
+    """
+
+    def __init__(
+        self,
+        pool_size: int = HTTP_POOL_SIZE,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        read_timeout: float = HTTP_READ_TIMEOUT
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        # All retries belong to `RetryPolicy`, so the adapter never retries;
+        # read timeouts surface as ReadTimeout so callers can split queries
+        retry = Retry(total=0, read=False, status=0, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Return the process-wide Shopify HTTP client, creating it on first use."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = ShopifyHTTPClient()
+        return _http_client
+
+
+def configure_http_client(**kwargs):
+    """Replace the process-wide Shopify HTTP client with a reconfigured one."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = ShopifyHTTPClient(**kwargs)
+        return _http_client
+
+
+class QueryCostScheduler:
+    """
+    Token-bucket model of the shop's GraphQL query budget.
+
+    Every GraphQL response carries `extensions.cost.throttleStatus`, which
+    reports the bucket size, the tokens currently available and the restore
+    rate. The scheduler re-syncs its model from that status after each call
+    and, between calls, refills the bucket at the reported restore rate, so
+    the next query is dispatched as soon as the budget allows instead of
+    after a fixed sleep.
+    """
+
+    def __init__(self, maximum_available=1000.0, restore_rate=50.0, default_cost=50.0):
+        self.maximum_available = maximum_available
+        self.restore_rate = restore_rate
+        self.default_cost = default_cost
+        self._available = maximum_available
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._available = min(self.maximum_available, self._available + elapsed * self.restore_rate)
+        self._updated_at = now
+
+    def acquire(self, cost=None):
+        """Block until `cost` tokens are available, then reserve them."""
+        cost = min(cost or self.default_cost, self.maximum_available)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._available >= cost:
+                    self._available -= cost
+                    return cost
+                wait = (cost - self._available) / self.restore_rate
+            logger.debug("Waiting %.2fs for query budget", wait)
+            time.sleep(wait)
+
+    def update(self, extensions):
+        """Re-sync the bucket from a response's `extensions.cost` block."""
+        cost = (extensions or {}).get("cost") or {}
+        status = cost.get("throttleStatus") or {}
+        if not status:
+            return
+        with self._lock:
+            self.maximum_available = float(status.get("maximumAvailable", self.maximum_available))
+            self.restore_rate = float(status.get("restoreRate", self.restore_rate))
+            self._available = float(status.get("currentlyAvailable", self._available))
+            self._updated_at = time.monotonic()
+            if cost.get("requestedQueryCost"):
+                self.default_cost = float(cost["requestedQueryCost"])
+
+    def throttle_delay(self, extensions):
+        """Seconds to wait after a throttled response before retrying."""
+        cost = (extensions or {}).get("cost") or {}
+        requested = float(cost.get("requestedQueryCost") or self.default_cost)
+        with self._lock:
+            deficit = max(requested - self._available, 1.0)
+            return deficit / self.restore_rate
+
+
+query_scheduler = QueryCostScheduler()
+
+
+class RetryPolicy:
+    """
+    Classifies failed ShopifyQL calls and decides whether and when to retry.
+
+    Failures fall into four classes: `THROTTLED` (HTTP 429 or a GraphQL
+    `THROTTLED` error), `NETWORK` (the connection failed or dropped),
+    `SERVER_ERROR` (HTTP 5xx or a GraphQL `INTERNAL_SERVER_ERROR`) and
+    `PERMANENT` (anything else, e.g. auth failures and query errors). Only
+    the first three are retried. Delays use full-jitter exponential backoff,
+    never less than a `Retry-After` header or the time the query budget
+    needs to refill, and a query stops retrying once `max_elapsed` seconds
+    have been spent on it.
+
+    Read timeouts are not retried: for ShopifyQL they almost always mean
+    the query is too large, and `core_functions.fetch_date_window` splits
+    the window instead.
+
+    Args:
+        max_attempts: Max calls per query, including the first
+        base_delay: Backoff delay before the first retry, in seconds
+        max_delay: Upper bound for a single backoff delay
+        max_elapsed: Upper bound for the total time spent on one query
+    """
+
+    THROTTLED = "throttled"
+    NETWORK = "network"
+    SERVER_ERROR = "server_error"
+    PERMANENT = "permanent"
+    RETRYABLE = frozenset({THROTTLED, NETWORK, SERVER_ERROR})
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY,
+                 max_delay=RETRY_MAX_DELAY, max_elapsed=RETRY_MAX_ELAPSED):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+
+    def classify_exception(self, exc):
+        if isinstance(exc, requests.ReadTimeout):
+            return self.PERMANENT
+        if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+            return self.NETWORK
+        return self.PERMANENT
+
+    def classify_response(self, response, data=None):
+        """Classify a response, or return None if it succeeded."""
+        if response.status_code == 429:
+            return self.THROTTLED
+        if response.status_code >= 500:
+            return self.SERVER_ERROR
+        if response.status_code != 200:
+            return self.PERMANENT
+        codes = {(error.get("extensions") or {}).get("code") for error in (data or {}).get("errors") or []}
+        if "THROTTLED" in codes:
+            return self.THROTTLED
+        if "INTERNAL_SERVER_ERROR" in codes:
+            return self.SERVER_ERROR
+        return None
+
+    def delay(self, attempt, retry_after=None, minimum=0.0):
+        """Seconds to sleep before retry number `attempt` (starting at 1)."""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        return max(backoff, minimum, retry_after or 0.0)
+
+    def should_retry(self, category, attempt, elapsed, delay):
+        return (
+            category in self.RETRYABLE
+            and attempt < self.max_attempts
+            and elapsed + delay <= self.max_elapsed
+        )
+
+
+retry_policy = RetryPolicy()
+
+
+def _retry_after(response):
+    """Parse a `Retry-After` header given in seconds, if any."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def query_fingerprint(query):
+    """Hash of the whitespace-normalized ShopifyQL query and the API version."""
+    normalized = " ".join(query.split())
+    return hashlib.sha256(f"{API_VERSION}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+class ShopifyQLCache:
+    """
+    On-disk cache of ShopifyQL `tableData`, keyed by query text.
+
+    Entries are gzip-compressed JSON files named by a hash of the
+    whitespace-normalized query and the API version. Queries over a fully
+    closed past period (an explicit `UNTIL` date before today and no
+    relative dates) never expire; anything with relative windows such as
+    `startOfDay(-14d)`, `yesterday` or `DURING last_year` lives for
+    `relative_ttl` seconds. The directory is kept under `max_bytes` by
+    evicting least-recently-used entries.
+
+    Args:
+        cache_dir: Directory holding the cache files
+        max_bytes: Size bound for the directory
+        relative_ttl: Seconds to keep results of relative-window queries
+    """
+
+    RELATIVE_DATE = re.compile(r"startOf|endOf|today|yesterday|DURING|[-+]\s*\d+\s*[dwmqy]\b", re.IGNORECASE)
+    UNTIL_DATE = re.compile(r"UNTIL\s+(\d{4}-\d{2}-\d{2})", re.IGNORECASE)
+
+    def __init__(self, cache_dir, max_bytes=QUERY_CACHE_MAX_MB * 1024 * 1024, relative_ttl=QUERY_CACHE_RELATIVE_TTL):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.relative_ttl = relative_ttl
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, query):
+        return self.cache_dir / f"{query_fingerprint(query)}.json.gz"
+
+    def ttl_for(self, query):
+        """Return the TTL in seconds for `query`, or None to keep it indefinitely."""
+        if self.RELATIVE_DATE.search(query):
+            return self.relative_ttl
+        until = self.UNTIL_DATE.search(query)
+        if until and datetime.date.fromisoformat(until.group(1)) < datetime.date.today():
+            return None
+        return self.relative_ttl
+
+    def get(self, query):
+        """Return the cached `tableData` for `query`, or None on a miss."""
+        path = self._path(query)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["ttl"] is not None and time.time() - entry["stored_at"] > entry["ttl"]:
+            path.unlink(missing_ok=True)
+            return None
+        # Touch the entry so eviction is least-recently-used
+        os.utime(path)
+        return entry["table_data"]
+
+    def put(self, query, table_data):
+        path = self._path(query)
+        entry = {"stored_at": time.time(), "ttl": self.ttl_for(query), "table_data": table_data}
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry_path in self.cache_dir.glob("*.json.gz"):
+                try:
+                    stat = entry_path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry_path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry_path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                entry_path.unlink(missing_ok=True)
+                total -= size
+
+
+_query_cache = ShopifyQLCache(QUERY_CACHE_DIR) if QUERY_CACHE_DIR else None
+
+
+def configure_query_cache(cache_dir=None, **kwargs):
+    """
+    Enable the ShopifyQL response cache in `cache_dir`, or disable it when
+    `cache_dir` is None.
+    """
+    global _query_cache
+    _query_cache = ShopifyQLCache(cache_dir, **kwargs) if cache_dir else None
+    return _query_cache
+
+
+def get_access_token_oauth(shop_url, client=None):
     """
     Exchange credentials for an access token (client credentials flow).
 
     Args:
         shop_url: the shop URL (e.g., 'yourstore.myshopify.com')
+        client: ShopifyHTTPClient to use (defaults to the shared client)
 
     Returns:
         access_token: The access token to use for API calls
@@ -36,7 +375,8 @@ def get_access_token_oauth(shop_url):
         'grant_type': "client_credentials"
     }
     
-    response = requests.post(token_url, json=payload)
+    client = client or get_http_client()
+    response = client.post(token_url, json=payload)
     
     if response.status_code == 200:
         data = response.json()
@@ -61,8 +401,29 @@ def connect_to_shopify(access_token=None):
     logger.info("Connected to %s", SHOP_URL)
 
 
-def run_shopifyQL_query(query, access_token=None):
-    """Run a ShopifyQL query and return results"""
+def run_shopifyQL_query(query, access_token=None, client=None, cache=None, policy=None, stats=None):
+    """
+    Run a ShopifyQL query and return results
+
+    Throttled, network and server failures are retried under `policy`
+    (default: the module `retry_policy`). If a `stats` dict is passed, it
+    is filled with the attempt count, retries per failure class, the
+    seconds spent waiting between attempts, the query cost reported by
+    Shopify, the round-trip time of the successful request (excluding
+    budget waits and retry backoff) and whether the result came from cache.
+    """
+    stats = {} if stats is None else stats
+    stats.update(attempts=0, retries={}, retry_seconds=0.0, query_cost=None, seconds=0.0, cached=False)
+    started = time.monotonic()
+    cache = cache or _query_cache
+    if cache is not None:
+        table_data = cache.get(query)
+        if table_data is not None:
+            logger.info("ShopifyQL cache hit")
+            stats["cached"] = True
+            return table_data
+
+    client = client or get_http_client()
     url = f"https://{SHOP_URL}/admin/api/{API_VERSION}/graphql.json"
     
     headers = {
@@ -94,36 +455,166 @@ def run_shopifyQL_query(query, access_token=None):
             }
     }
     
-    response = requests.post(url, json=graphql_query, headers=headers)
-    
-    if response.status_code == 200:
-        data = response.json()
-
-        rate_limit_errors = data.get("errors")
-        result = data.get("data", {}).get("shopifyqlQuery", {})
-        
-        if rate_limit_errors:
-            errors = data.get("errors")[0].get("message")
-            logger.error("Rate-Limit Error: %s", data)                        
+    policy = policy or retry_policy
+    while True:
+        stats["attempts"] += 1
+        query_scheduler.acquire()
+        response, data = None, None
+        try:
+            sent = time.monotonic()
+            response = client.post(url, json=graphql_query, headers=headers)
+            round_trip = time.monotonic() - sent
+        except requests.RequestException as e:
+            category, error = policy.classify_exception(e), e
         else:
-            errors = result.get("parseErrors")                       
+            if response.status_code == 200:
+                data = response.json()
+                query_scheduler.update(data.get("extensions"))
+            category, error = policy.classify_response(response, data), None
 
-        if errors:
-            logger.info("Shopify Query: %s", query)            
-            raise ValueError(f"ShopifyQL query errors: {errors}")
-        else:
-            table_data = result.get("tableData", {})
+        if category is None:
+            cost = (data.get("extensions") or {}).get("cost") or {}
+            stats["query_cost"] = cost.get("actualQueryCost") or cost.get("requestedQueryCost")
+            stats["seconds"] = round_trip
+            if stats["retries"]:
+                logger.info("ShopifyQL query succeeded after retries: %s (%.1fs waiting)", stats["retries"], stats["retry_seconds"])
+            break
+
+        minimum = query_scheduler.throttle_delay((data or {}).get("extensions")) if category == policy.THROTTLED else 0.0
+        delay = policy.delay(stats["attempts"], retry_after=_retry_after(response), minimum=minimum)
+        if not policy.should_retry(category, stats["attempts"], time.monotonic() - started, delay):
+            logger.error("ShopifyQL query failed (%s) after %s attempts", category, stats["attempts"])
+            if error is not None:
+                raise error
+            if response.status_code != 200:
+                raise Exception(f"GraphQL query failed: {response.text}")
+            break
+        logger.warning("ShopifyQL %s failure, retrying in %.2fs (attempt %s)", category, delay, stats["attempts"])
+        stats["retries"][category] = stats["retries"].get(category, 0) + 1
+        stats["retry_seconds"] += delay
+        time.sleep(delay)
+
+    result = (data.get("data") or {}).get("shopifyqlQuery") or {}
+
+    graphql_errors = data.get("errors")
+    if graphql_errors:
+        errors = graphql_errors[0].get("message")
+        logger.error("GraphQL Error: %s", data)
     else:
-        raise Exception(f"GraphQL query failed: {response.text}")
+        errors = result.get("parseErrors")
+
+    if errors:
+        logger.info("Shopify Query: %s", query)
+        raise ValueError(f"ShopifyQL query errors: {errors}")
+
+    table_data = result.get("tableData", {})
+
+    if cache is not None:
+        cache.put(query, table_data)
 
     return table_data
 
 
+async def run_shopifyQL_query_async(query, access_token=None, client=None, cache=None, policy=None, stats=None):
+    """
+    Async variant of `run_shopifyQL_query`.
+
+    Each call runs the blocking query in a worker thread, so concurrent
+    awaits share the pooled keep-alive client, the response cache, the
+    retry policy and the query cost scheduler with synchronous callers.
+    The scheduler still paces dispatch, so running queries concurrently
+    never overdraws the shop's query budget.
+    """
+    return await asyncio.to_thread(run_shopifyQL_query, query, access_token, client, cache, policy, stats)
+
+
+
+def get_bigquery_client(project_id=None):
+    """
+    Return the process-wide BigQuery client for `project_id`.
+
+    The client (and its service account credentials) is built once and
+    shared by every read and write in the run. `project_id` defaults to
+    `GCP_PROJECT_ID` before the cache lookup, so callers that omit it get
+    the same client as those that pass it.
+
+    Note:
+        Uses the module-level `credentials_path` for service account auth.
+    """
+    return _get_bigquery_client(project_id or os.getenv("GCP_PROJECT_ID"))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_bigquery_client(project_id):
+    if credentials_path:
+        return bigquery.Client.from_service_account_json(
+            credentials_path,
+            project=project_id
+        )
+    return bigquery.Client(project=project_id)
+
+
+class BigQueryMetadataCache:
+    """
+    Short-lived cache of dataset and table existence.
+
+    Lets repeated loads in one run skip the `get_dataset` / `get_table`
+    round trips for objects already seen. Entries expire after `ttl`
+    seconds and are updated whenever this module creates or deletes the
+    object.
+    """
+
+    def __init__(self, ttl=BIGQUERY_METADATA_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, ref):
+        """Return True/False if `ref`'s existence is cached, else None."""
+        with self._lock:
+            entry = self._entries.get(ref)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            return entry[0]
+
+    def set(self, ref, exists):
+        with self._lock:
+            self._entries[ref] = (exists, time.monotonic() + self.ttl)
+
+    def invalidate(self, ref=None):
+        with self._lock:
+            if ref is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(ref, None)
+
+
+bigquery_metadata = BigQueryMetadataCache()
+
+
+@functools.lru_cache(maxsize=None)
+def get_bigquery_storage_client():
+    """
+    Return the process-wide BigQuery Storage Read API client, or None when
+    `google-cloud-bigquery-storage` is not installed.
+    """
+    if bigquery_storage is None:
+        logger.info("google-cloud-bigquery-storage not installed, reading BigQuery results over REST")
+        return None
+    if credentials_path:
+        credentials = service_account.Credentials.from_service_account_file(credentials_path)
+        return bigquery_storage.BigQueryReadClient(credentials=credentials)
+    return bigquery_storage.BigQueryReadClient()
+
 
 def read_dataframe_from_bigquery(sql_query):
 
     """
     Read a Google BigQuery table into a pandas DataFrame.
+
+    Results are downloaded as Arrow through the BigQuery Storage Read API
+    when it is available, falling back to REST row pagination otherwise or
+    if the Storage API call fails (e.g. missing read-session permission).
     
     Args:
         bigquery: Full table reference in the format 'project.dataset.table'
@@ -138,17 +629,21 @@ def read_dataframe_from_bigquery(sql_query):
     """
     
     try:
-        # Initialize BigQuery client
-        if credentials_path:
-            client = bigquery.Client.from_service_account_json(
-                credentials_path
-            )
-        else:
-            client = bigquery.Client()
-        
-        # Read table into DataFrame
-        df = client.query(sql_query).to_dataframe()
-        logger.info("Successfully read rows from BigQuery")
+        client = get_bigquery_client()
+        job = client.query(sql_query)
+        rows = job.result()
+
+        bqstorage_client = get_bigquery_storage_client()
+        try:
+            df = rows.to_dataframe(bqstorage_client=bqstorage_client, create_bqstorage_client=False)
+        except Exception as e:
+            if bqstorage_client is None:
+                raise
+            # Page through the finished job's results rather than re-running the query
+            logger.warning("Storage Read API failed, falling back to REST: %s", str(e))
+            df = job.result().to_dataframe(create_bqstorage_client=False)
+
+        logger.info("Successfully read %s rows from BigQuery", len(df))
         return df
     
     except Exception as e:
@@ -156,6 +651,254 @@ def read_dataframe_from_bigquery(sql_query):
         raise
 
 
+def run_bigquery_statement(sql_query):
+    """
+    Run a BigQuery DDL/DML statement and wait for it to finish.
+
+    Returns:
+        bigquery.QueryJob: The finished job
+    """
+    try:
+        job = get_bigquery_client().query(sql_query)
+        job.result()
+        logger.info("BigQuery statement finished (%s bytes processed)", job.total_bytes_processed)
+        return job
+    except Exception as e:
+        logger.exception("Error running BigQuery statement: %s", str(e))
+        raise
+
+
+def drop_bigquery_table(project_id, dataset_id, table_id, table_type=None):
+    """
+    Drop a table or view if it exists.
+
+    Args:
+        project_id: GCP project ID
+        dataset_id: BigQuery dataset ID
+        table_id: BigQuery table or view ID
+        table_type: Only drop it if it is of this type ('TABLE' or 'VIEW')
+
+    Returns:
+        bool: True if it was dropped
+    """
+    client = get_bigquery_client(project_id)
+    table_ref = f"{project_id}.{dataset_id}.{table_id}"
+    try:
+        table = client.get_table(table_ref)
+    except NotFound:
+        return False
+    if table_type is not None and table.table_type != table_type:
+        return False
+    client.delete_table(table_ref, not_found_ok=True)
+    bigquery_metadata.invalidate(table_ref)
+    logger.info("Dropped %s %s", table.table_type, table_ref)
+    return True
+
+
+def replace_bigquery_view(project_id, dataset_id, view_id, view_query):
+    """
+    Create or replace a view, dropping a table of the same name first.
+
+    Args:
+        project_id: GCP project ID
+        dataset_id: BigQuery dataset ID
+        view_id: BigQuery view ID
+        view_query: SELECT statement the view is defined by
+    """
+    view_ref = f"{project_id}.{dataset_id}.{view_id}"
+    drop_bigquery_table(project_id, dataset_id, view_id, table_type='TABLE')
+    run_bigquery_statement(f"CREATE OR REPLACE VIEW `{view_ref}` AS {view_query}")
+    logger.info("Published view %s", view_ref)
+
+
+def bigquery_schema_from_dataframe(df: pd.DataFrame) -> list:
+    """
+    Derive an explicit BigQuery schema from DataFrame dtypes.
+
+    Object columns are typed from their first non-null value, so columns of
+    `datetime.date` map to DATE and everything else to STRING.
+
+    Args:
+        df: pandas DataFrame to describe
+
+    Returns:
+        list: `bigquery.SchemaField` per column
+    """
+    schema = []
+    for name, dtype in df.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            field_type = "BOOL"
+        elif pd.api.types.is_integer_dtype(dtype):
+            field_type = "INT64"
+        elif pd.api.types.is_float_dtype(dtype):
+            field_type = "FLOAT64"
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            field_type = "TIMESTAMP" if getattr(dtype, "tz", None) else "DATETIME"
+        else:
+            non_null = df[name].dropna()
+            first = non_null.iloc[0] if len(non_null) else None
+            if isinstance(first, datetime.datetime):
+                field_type = "DATETIME"
+            elif isinstance(first, datetime.date):
+                field_type = "DATE"
+            else:
+                field_type = "STRING"
+        schema.append(bigquery.SchemaField(name, field_type))
+    return schema
+
+
+def ensure_dataset(client, project_id, dataset_id):
+    """Create the dataset if it does not exist yet."""
+    dataset_ref = client.dataset(dataset_id)
+    dataset_key = f"{project_id}.{dataset_id}"
+    if not bigquery_metadata.get(dataset_key):
+        try:
+            client.get_dataset(dataset_ref)
+            logger.info("Dataset %s exists", dataset_id)
+        except NotFound:
+            dataset = bigquery.Dataset(dataset_ref)
+            dataset.location = "US"  # Change as needed
+            client.create_dataset(dataset)
+            logger.info("Created dataset %s", dataset_id)
+        bigquery_metadata.set(dataset_key, True)
+
+
+def create_staging_table(client, table_ref, df):
+    """
+    Create an empty staging table next to `table_ref` with `df`'s schema.
+
+    The table expires after a day, so a run that dies before swapping or
+    merging it in does not leave it behind.
+    """
+    staging_ref = f"{table_ref}__staging_{uuid.uuid4().hex[:8]}"
+    staging_table = bigquery.Table(staging_ref, schema=bigquery_schema_from_dataframe(df))
+    staging_table.expires = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    return client.create_table(staging_table)
+
+
+class PendingLoad:
+    """
+    A submitted load job and the steps to publish it.
+
+    Replace loads go to a staging table first. `commit` then swaps the
+    staging table into the target with a WRITE_TRUNCATE copy job, which is
+    atomic, so readers never see a missing or half-loaded table. `abort`
+    cancels the load and drops the staging table, leaving the target as it
+    was.
+    """
+
+    def __init__(self, client, job, table_ref, staging_ref=None):
+        self.client = client
+        self.job = job
+        self.table_ref = table_ref
+        self.staging_ref = staging_ref
+
+    def wait(self):
+        self.job.result()
+
+    def commit(self):
+        if self.staging_ref:
+            copy_config = bigquery.CopyJobConfig(
+                write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+            )
+            self.client.copy_table(self.staging_ref, self.table_ref, job_config=copy_config).result()
+            self.client.delete_table(self.staging_ref, not_found_ok=True)
+            logger.info("Swapped staging table into %s", self.table_ref)
+        bigquery_metadata.set(self.table_ref, True)
+
+    def abort(self):
+        if not self.job.done():
+            self.job.cancel()
+        if self.staging_ref:
+            self.client.delete_table(self.staging_ref, not_found_ok=True)
+        bigquery_metadata.invalidate(self.table_ref)
+
+
+def submit_dataframe_load(
+    df: pd.DataFrame,
+    project_id: str,
+    dataset_id: str,
+    table_id: str,
+    if_exists: str = 'append'
+) -> PendingLoad:
+    """
+    Prepare the target table and submit a load job without waiting on it.
+
+    With if_exists='replace' the data is loaded into a short-lived staging
+    table, and the target is only replaced when the returned load is
+    committed.
+
+    Args:
+        df: pandas DataFrame to write
+        project_id: GCP project ID
+        dataset_id: BigQuery dataset ID
+        table_id: BigQuery table ID
+        if_exists: What to do if table exists ('fail', 'replace', 'append')
+
+    Returns:
+        PendingLoad: The running load job, to be waited on and committed
+
+    Raises:
+        ValueError: If if_exists parameter is invalid
+    Note:
+        Uses the module-level `credentials_path` for service account auth.
+    """
+
+    # Validate if_exists parameter
+    valid_options = ['fail', 'replace', 'append']
+    if if_exists not in valid_options:
+        raise ValueError(f"if_exists must be one of {valid_options}")
+
+    client = get_bigquery_client(project_id)
+
+    # Construct full table reference
+    table_ref = f"{project_id}.{dataset_id}.{table_id}"
+
+    ensure_dataset(client, project_id, dataset_id)
+
+    # Check if table exists
+    table_exists = bigquery_metadata.get(table_ref)
+    if table_exists is None:
+        try:
+            client.get_table(table_ref)
+            table_exists = True
+        except NotFound:
+            table_exists = False
+        bigquery_metadata.set(table_ref, table_exists)
+
+    if table_exists:
+        logger.info("Table %s exists", table_id)
+
+        if if_exists == 'fail':
+            raise ValueError(f"Table {table_ref} already exists and if_exists='fail'")
+    else:
+        logger.info("Table %s does not exist, will create", table_id)
+
+    # Configure job settings
+    job_config = bigquery.LoadJobConfig()
+    staging_ref = None
+    load_ref = table_ref
+
+    if if_exists == 'replace':
+        staging_table = create_staging_table(client, table_ref, df)
+        staging_ref = load_ref = staging_table.reference
+        job_config.schema = staging_table.schema
+        job_config.write_disposition = bigquery.WriteDisposition.WRITE_APPEND
+    elif not table_exists:
+        job_config.schema = bigquery_schema_from_dataframe(df)
+        job_config.write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE
+    else:  # append
+        job_config.write_disposition = bigquery.WriteDisposition.WRITE_APPEND
+
+    # Write DataFrame to BigQuery
+    job = client.load_table_from_dataframe(
+        df,
+        load_ref,
+        job_config=job_config
+    )
+
+    return PendingLoad(client, job, table_ref, staging_ref)
+
 
 def write_dataframe_to_bigquery(
     df: pd.DataFrame,
@@ -184,75 +927,274 @@ def write_dataframe_to_bigquery(
         Uses the module-level `credentials_path` for service account auth.
     """
     
-    # Validate if_exists parameter
-    valid_options = ['fail', 'replace', 'append']
-    if if_exists not in valid_options:
-        raise ValueError(f"if_exists must be one of {valid_options}")
-    
-    # Initialize BigQuery client
-    if credentials_path:
-        client = bigquery.Client.from_service_account_json(
-            credentials_path,
-            project=project_id
-        )
-    else:
-        client = bigquery.Client(project=project_id)
-    
-    # Construct full table reference
     table_ref = f"{project_id}.{dataset_id}.{table_id}"
-    
+
+    load = None
     try:
-        # Check if dataset exists, create if not
-        dataset_ref = client.dataset(dataset_id)
-        try:
-            client.get_dataset(dataset_ref)
-            logger.info("Dataset %s exists", dataset_id)
-        except NotFound:
-            dataset = bigquery.Dataset(dataset_ref)
-            dataset.location = "US"  # Change as needed
-            client.create_dataset(dataset)
-            logger.info("Created dataset %s", dataset_id)
+        load = submit_dataframe_load(df, project_id, dataset_id, table_id, if_exists)
+
+        # Wait for job to complete, then publish it
+        load.wait()
+        load.commit()
+
+        logger.info("Successfully loaded %s rows to %s", load.job.output_rows, table_ref)
         
-        # Check if table exists
+    except Exception as e:
+        if load is not None:
+            load.abort()
+        else:
+            bigquery_metadata.invalidate(table_ref)
+        logger.exception("Error writing to BigQuery: %s", str(e))
+        raise
+
+
+def write_dataframes_to_bigquery(
+    frames: dict,
+    project_id: str,
+    dataset_id: str,
+    if_exists: str = 'append'
+) -> dict:
+    """
+    Load several DataFrames into BigQuery tables concurrently.
+
+    All load jobs are submitted before any is waited on. Replace loads go
+    to staging tables, and targets are only published once every load has
+    succeeded; if any load fails, the others are cancelled and their
+    staging tables dropped, leaving every target untouched.
+
+    Publishing swaps one table at a time (each swap is atomic on its own,
+    but BigQuery cannot swap several tables in one transaction). If a swap
+    fails, the remaining staging tables are dropped and the error log names
+    the tables that were already published. Append loads have no staging
+    table and land as soon as their job finishes.
+
+    Args:
+        frames: Mapping of table ID to the DataFrame to load into it
+        project_id: GCP project ID
+        dataset_id: BigQuery dataset ID
+        if_exists: What to do if a table exists ('fail', 'replace', 'append')
+
+    Returns:
+        dict: Per-table stats with `rows`, `bytes` and `seconds` keys
+
+    Raises:
+        Exception: If any load job fails
+    """
+    loads = {}
+    stats = {}
+
+    try:
+        for table_id, df in frames.items():
+            loads[table_id] = submit_dataframe_load(df, project_id, dataset_id, table_id, if_exists)
+
+        for table_id, load in loads.items():
+            load.wait()
+            job = load.job
+            stats[table_id] = {
+                'rows': job.output_rows,
+                'bytes': job.output_bytes,
+                'seconds': (job.ended - job.started).total_seconds()
+            }
+    except Exception as e:
+        for load in loads.values():
+            load.abort()
+        logger.exception("Error writing to BigQuery: %s", str(e))
+        raise
+
+    published = []
+    try:
+        for table_id, load in loads.items():
+            load.commit()
+            published.append(table_id)
+            logger.info("Loaded %s rows (%s bytes) to %s in %.1fs",
+                        stats[table_id]['rows'], stats[table_id]['bytes'], load.table_ref, stats[table_id]['seconds'])
+    except Exception as e:
+        for table_id, load in loads.items():
+            if table_id not in published:
+                load.abort()
+        logger.exception("Error publishing to BigQuery after publishing %s of %s tables (%s): %s",
+                         len(published), len(loads), published or "none", str(e))
+        raise
+
+    return stats
+
+
+def merge_dataframe_to_bigquery(
+    df: pd.DataFrame,
+    project_id: str,
+    dataset_id: str,
+    table_id: str,
+    key_columns: list,
+    delete_before: tuple = None
+) -> None:
+    """
+    Upsert a pandas DataFrame into a BigQuery table.
+
+    Rows are loaded into a staging table and merged into the target with a
+    single MERGE statement keyed on `key_columns`: matching rows are
+    updated, new rows inserted. With `delete_before`, the same statement
+    also deletes target rows older than a cutoff, so a table kept to a
+    rolling window does not accumulate history. If the target does not
+    exist yet, the frame is written as a new table.
+
+    Args:
+        df: pandas DataFrame to upsert
+        project_id: GCP project ID
+        dataset_id: BigQuery dataset ID
+        table_id: BigQuery table ID
+        key_columns: Columns identifying a row
+        delete_before: Optional `(column, date)`; target rows whose `column`
+            falls before `date` and that are not in `df` are deleted
+
+    Returns:
+        None
+
+    Raises:
+        Exception: If the load or merge fails
+    """
+    client = get_bigquery_client(project_id)
+    table_ref = f"{project_id}.{dataset_id}.{table_id}"
+
+    table_exists = bigquery_metadata.get(table_ref)
+    if table_exists is None:
         try:
-            table = client.get_table(table_ref)
+            client.get_table(table_ref)
             table_exists = True
-            logger.info("Table %s exists", table_id)
-            
-            if if_exists == 'fail':
-                raise ValueError(f"Table {table_ref} already exists and if_exists='fail'")
-            elif if_exists == 'replace':
-                client.delete_table(table_ref)
-                logger.info("Deleted existing table %s", table_id)
-                table_exists = False
         except NotFound:
             table_exists = False
-            logger.info("Table %s does not exist, will create", table_id)
-        
-        # Configure job settings
-        job_config = bigquery.LoadJobConfig()
-        
-        if not table_exists or if_exists == 'replace':
-            # Auto-detect schema for new tables
-            job_config.autodetect = True
-            job_config.write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE
-        else:  # append
-            job_config.write_disposition = bigquery.WriteDisposition.WRITE_APPEND
-        
-        # Write DataFrame to BigQuery
-        job = client.load_table_from_dataframe(
-            df,
-            table_ref,
-            job_config=job_config
+        bigquery_metadata.set(table_ref, table_exists)
+
+    if not table_exists:
+        write_dataframe_to_bigquery(df, project_id, dataset_id, table_id, if_exists='replace')
+        return
+
+    staging_ref = None
+    try:
+        staging_table = create_staging_table(client, table_ref, df)
+        staging_ref = staging_table.reference
+        job_config = bigquery.LoadJobConfig(
+            schema=staging_table.schema,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND
         )
-        
-        # Wait for job to complete
+        client.load_table_from_dataframe(df, staging_ref, job_config=job_config).result()
+
+        columns = list(df.columns)
+        on_clause = " AND ".join(f"T.`{c}` = S.`{c}`" for c in key_columns)
+        update_clause = ", ".join(f"`{c}` = S.`{c}`" for c in columns if c not in key_columns)
+        insert_columns = ", ".join(f"`{c}`" for c in columns)
+        insert_values = ", ".join(f"S.`{c}`" for c in columns)
+        merge_sql = f"""
+            MERGE `{table_ref}` T
+            USING `{staging_table.project}.{staging_table.dataset_id}.{staging_table.table_id}` S
+            ON {on_clause}
+            WHEN MATCHED THEN UPDATE SET {update_clause}
+            WHEN NOT MATCHED THEN INSERT ({insert_columns}) VALUES ({insert_values})
+        """
+        if delete_before is not None:
+            cutoff_column, cutoff = delete_before
+            merge_sql += f"""    WHEN NOT MATCHED BY SOURCE AND CAST(T.`{cutoff_column}` AS DATE) < DATE '{cutoff.isoformat()}' THEN DELETE
+        """
+        job = client.query(merge_sql)
         job.result()
-        
-        # Get updated table info
-        table = client.get_table(table_ref)
-        logger.info("Successfully loaded %s rows to %s", table.num_rows, table_ref)
-        
+        logger.info("Merged %s rows into %s (%s affected)", len(df), table_ref, job.num_dml_affected_rows)
+
     except Exception as e:
-        logger.exception("Error writing to BigQuery: %s", str(e))
+        logger.exception("Error merging into BigQuery: %s", str(e))
+        raise
+    finally:
+        if staging_ref is not None:
+            client.delete_table(staging_ref, not_found_ok=True)
+
+
+def stream_dataframes_to_bigquery(
+    chunks,
+    project_id: str,
+    dataset_id: str,
+    table_id: str,
+    if_exists: str = 'replace',
+    min_rows_per_load: int = 250000
+) -> int:
+    """
+    Write an iterator of DataFrame chunks to a BigQuery table with bounded memory.
+
+    Chunks are appended to a staging table as they arrive, buffered only
+    until `min_rows_per_load` rows are pending so the table is not hit with
+    one load job per small batch. The target is then published once with a
+    single copy job (WRITE_TRUNCATE for 'replace', WRITE_APPEND for
+    'append'), so readers never see a partial table.
+
+    Args:
+        chunks: Iterable of DataFrames sharing one schema
+        project_id: GCP project ID
+        dataset_id: BigQuery dataset ID
+        table_id: BigQuery table ID
+        if_exists: 'replace' or 'append'
+        min_rows_per_load: Rows to buffer before each staging load
+
+    Returns:
+        int: Total rows written
+
+    Raises:
+        ValueError: If if_exists parameter is invalid
+        Exception: If any load or the final copy fails
+    """
+    valid_options = ['replace', 'append']
+    if if_exists not in valid_options:
+        raise ValueError(f"if_exists must be one of {valid_options}")
+
+    client = get_bigquery_client(project_id)
+    table_ref = f"{project_id}.{dataset_id}.{table_id}"
+    ensure_dataset(client, project_id, dataset_id)
+
+    staging_table = None
+    job_config = None
+    pending = []
+    pending_rows = 0
+    total_rows = 0
+
+    def flush():
+        client.load_table_from_dataframe(
+            pd.concat(pending, ignore_index=True),
+            staging_table.reference,
+            job_config=job_config
+        ).result()
+
+    try:
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            if staging_table is None:
+                staging_table = create_staging_table(client, table_ref, chunk)
+                job_config = bigquery.LoadJobConfig(
+                    schema=staging_table.schema,
+                    write_disposition=bigquery.WriteDisposition.WRITE_APPEND
+                )
+            pending.append(chunk)
+            pending_rows += len(chunk)
+            if pending_rows >= min_rows_per_load:
+                flush()
+                total_rows += pending_rows
+                logger.info("Staged %s rows for %s", total_rows, table_ref)
+                pending, pending_rows = [], 0
+
+        if staging_table is None:
+            logger.info("No rows to write to %s", table_ref)
+            return 0
+        if pending:
+            flush()
+            total_rows += pending_rows
+
+        write_disposition = (bigquery.WriteDisposition.WRITE_TRUNCATE if if_exists == 'replace'
+                             else bigquery.WriteDisposition.WRITE_APPEND)
+        copy_config = bigquery.CopyJobConfig(write_disposition=write_disposition)
+        client.copy_table(staging_table.reference, table_ref, job_config=copy_config).result()
+        bigquery_metadata.set(table_ref, True)
+        logger.info("Successfully streamed %s rows to %s", total_rows, table_ref)
+        return total_rows
+
+    except Exception as e:
+        logger.exception("Error streaming to BigQuery: %s", str(e))
         raise
+    finally:
+        if staging_table is not None:
+            client.delete_table(staging_table.reference, not_found_ok=True)
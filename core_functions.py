@@ -1,19 +1,516 @@
 from operator import itemgetter
+import numpy as np
 import pandas as pd
-import functools
-from access_functions import write_dataframe_to_bigquery
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from access_functions import query_scheduler, write_dataframe_to_bigquery, write_dataframes_to_bigquery, merge_dataframe_to_bigquery, read_dataframe_from_bigquery, stream_dataframes_to_bigquery, run_bigquery_statement, drop_bigquery_table, replace_bigquery_view
+from google.cloud.exceptions import NotFound
+import queries as qry
 import os
 from dotenv import load_dotenv
 import logging
-from datetime import datetime
+from datetime import date
+from dateutil.relativedelta import relativedelta
+import requests
+from date_dimension import build_date_dimension
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from pathlib import Path
+import threading
+import json
+import hashlib
 
 load_dotenv()
 
 p_id = os.getenv("GCP_PROJECT_ID")
 d_id = os.getenv("BIGQUERY_DATASET_ID")
+WEEKLY_INVENTORY_TABLE = os.getenv("BIGQUERY_WEEKLY_TABLE", "all_sku_weekly_inventory_data")
+SKU_WEEKLY_AGG_TABLE = os.getenv("BIGQUERY_SKU_AGG_TABLE", "sku_weekly_agg")
+SHOPIFYQL_ROW_LIMIT = int(os.getenv("SHOPIFYQL_ROW_LIMIT", "1000"))
 logger = logging.getLogger(__name__)
 
 
+class BatchExecutionError(Exception):
+    """Raised when one or more batches still fail after their retries."""
+
+    def __init__(self, failures, results):
+        self.failures = failures
+        self.results = results
+        super().__init__(f"{len(failures)} batch(es) failed: {sorted(failures)}")
+
+
+class ChunkCollector:
+    """
+    Gather per-batch DataFrames and materialize them once at the end.
+
+    Appending to a growing DataFrame with `pd.concat` inside a loop copies
+    every accumulated row on each iteration. The collector keeps the chunks
+    as-is and concatenates them a single time in `to_frame`.
+
+    Args:
+        spill_dir: Optional directory. When set, each chunk is written there
+            as Parquet as soon as it is added and only read back when the
+            collector is iterated or materialized.
+    """
+
+    def __init__(self, spill_dir=None):
+        self.spill_dir = spill_dir
+        self.rows = 0
+        self._chunks = {}
+        self._lock = threading.Lock()
+        if spill_dir:
+            Path(spill_dir).mkdir(parents=True, exist_ok=True)
+
+    def add(self, df, key=None):
+        """
+        Add one chunk. Chunks are returned ordered by `key`, which defaults
+        to insertion order, so concurrent producers can add out of order.
+        """
+        with self._lock:
+            key = len(self._chunks) if key is None else key
+            self.rows += len(df)
+        if self.spill_dir:
+            chunk = os.path.join(self.spill_dir, f"chunk_{key:06d}.parquet")
+            df.to_parquet(chunk, index=False)
+        else:
+            chunk = df
+        with self._lock:
+            self._chunks[key] = chunk
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def __iter__(self):
+        for key in sorted(self._chunks):
+            chunk = self._chunks[key]
+            yield pd.read_parquet(chunk) if isinstance(chunk, str) else chunk
+
+    def to_frame(self):
+        """Concatenate all chunks into one DataFrame."""
+        if not self._chunks:
+            return pd.DataFrame()
+        return pd.concat([identifiers.unify(chunk) for chunk in self], ignore_index=True)
+
+
+class CheckpointStore:
+    """
+    Resumable per-batch checkpoints for long-running loads.
+
+    Each finished batch is written to `{root}/{run_id}/` as Parquet and
+    recorded in `manifest.json` with the hash of the query that produced
+    it. A rerun with the same run ID skips every batch whose key and query
+    hash are already recorded, so a failure late in a load only costs the
+    unfinished batches. Iteration and `to_frame` match `ChunkCollector`, so
+    the completed set can be assembled and uploaded in one final step.
+    Once a run is committed its checkpoints are spent: opening the same
+    run ID again starts it over from an empty manifest.
+
+    Args:
+        root: Checkpoint root directory
+        run_id: Identifier of the run being resumed or started
+    """
+
+    def __init__(self, root, run_id):
+        self.run_id = run_id
+        self.run_dir = Path(root) / str(run_id)
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self._manifest_path = self.run_dir / "manifest.json"
+        self._lock = threading.Lock()
+        self._manifest = {'run_id': run_id, 'committed': False, 'batches': {}}
+        if self._manifest_path.exists():
+            manifest = json.loads(self._manifest_path.read_text(encoding="utf-8"))
+            if manifest.get('committed'):
+                logger.info("Run %s was already committed; starting it over", run_id)
+                for entry in manifest['batches'].values():
+                    (self.run_dir / entry['file']).unlink(missing_ok=True)
+                self._write_manifest()
+            else:
+                self._manifest = manifest
+                logger.info("Resuming run %s with %s completed batches", run_id, len(manifest['batches']))
+
+    @property
+    def rows(self):
+        return sum(entry['rows'] for entry in self._manifest['batches'].values())
+
+    def is_done(self, key, query_hash):
+        entry = self._manifest['batches'].get(str(key))
+        return entry is not None and entry['query_hash'] == query_hash
+
+    @property
+    def batches(self):
+        """Manifest entries of the completed batches, by key."""
+        with self._lock:
+            return {key: dict(entry) for key, entry in self._manifest['batches'].items()}
+
+    def completed_items(self, query_hash=None):
+        """
+        Return every item recorded against a completed batch, or only those
+        of batches produced by the query with `query_hash`.
+        """
+        return {
+            item
+            for entry in self._manifest['batches'].values()
+            if query_hash is None or entry['query_hash'] == query_hash
+            for item in entry.get('items', [])
+        }
+
+    def add(self, df, key, query_hash, items=None):
+        """Checkpoint one finished batch."""
+        key = str(key)
+        path = self.run_dir / f"batch_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.parquet"
+        df.to_parquet(path, index=False)
+        with self._lock:
+            self._manifest['batches'][key] = {
+                'file': path.name,
+                'rows': len(df),
+                'query_hash': query_hash,
+                'items': list(items or []),
+            }
+            self._write_manifest()
+
+    def retain(self, keys):
+        """
+        Drop checkpointed batches whose key is not in `keys`, so batches
+        left over from a different batch plan are not assembled.
+        """
+        keys = {str(key) for key in keys}
+        self.discard([key for key in self.batches if key not in keys])
+
+    def discard(self, keys):
+        """Drop the checkpointed batches with the given keys."""
+        keys = [str(key) for key in keys]
+        with self._lock:
+            for key in keys:
+                entry = self._manifest['batches'].pop(key)
+                (self.run_dir / entry['file']).unlink(missing_ok=True)
+            if keys:
+                logger.info("Dropped %s stale checkpointed batches", len(keys))
+                self._write_manifest()
+
+    def commit(self):
+        """Mark the run as fully assembled and uploaded."""
+        with self._lock:
+            self._manifest['committed'] = True
+            self._write_manifest()
+        logger.info("Committed run %s (%s batches, %s rows)", self.run_id, len(self), self.rows)
+
+    def _write_manifest(self):
+        tmp_path = self._manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._manifest, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self._manifest_path)
+
+    def __len__(self):
+        return len(self._manifest['batches'])
+
+    def __iter__(self):
+        for key in sorted(self._manifest['batches']):
+            yield pd.read_parquet(self.run_dir / self._manifest['batches'][key]['file'])
+
+    def to_frame(self):
+        """Concatenate all checkpointed batches into one DataFrame."""
+        if not len(self):
+            return pd.DataFrame()
+        return pd.concat([identifiers.unify(chunk) for chunk in self], ignore_index=True)
+
+
+def execute_batches(batches, fetch, max_workers=1, max_attempts=2):
+    """
+    Run `fetch` over every batch with bounded concurrency.
+
+    Args:
+        batches: Sequence of batch inputs
+        fetch: Callable taking one batch and returning its result
+        max_workers: Max batches in flight at once
+        max_attempts: Attempts per batch before it is reported as failed
+
+    Returns:
+        list: Results in the same order as `batches`
+
+    Raises:
+        BatchExecutionError: If any batch fails on every attempt. The error
+            carries the per-batch exceptions and the completed results, so
+            only the failed batches need to be re-run.
+    """
+    results = [None] * len(batches)
+    pending = list(range(len(batches)))
+    failures = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for attempt in range(1, max_attempts + 1):
+            futures = {i: executor.submit(fetch, batches[i]) for i in pending}
+            pending = []
+            for i, future in futures.items():
+                try:
+                    results[i] = future.result()
+                    failures.pop(i, None)
+                except Exception as e:
+                    logger.warning("Batch %s failed on attempt %s/%s: %s", i, attempt, max_attempts, e)
+                    failures[i] = e
+                    pending.append(i)
+            if not pending:
+                break
+
+    if failures:
+        raise BatchExecutionError(failures, results)
+
+    return results
+
+
+class AdaptiveBatcher:
+    """
+    Sizes item batches from the cost, latency and row count of earlier ones.
+
+    After every query the batcher updates smoothed per-item estimates of
+    query cost, round-trip time and rows returned, and sizes the next batch so
+    that cost and time stay within `headroom` of the shop's query budget
+    (`query_scheduler.maximum_available`) and `max_seconds`, and rows stay
+    below the ShopifyQL row limit. Batches grow by at most 2x per step and
+    shrink immediately. A response that reaches the row limit may be
+    truncated, so `observe` reports it and the caller re-splits that batch;
+    a batch that timed out is reported with `timed_out` and re-split too.
+
+    Args:
+        initial_size: Size of the first batches, before anything is observed
+        min_size: Smallest batch size
+        max_size: Largest batch size
+        max_rows: Row limit of a single ShopifyQL response
+        max_seconds: Target upper bound for a single query's round-trip time
+        headroom: Fraction of the cost and time ceilings to aim for
+        smoothing: Weight of the newest observation in the estimates
+    """
+
+    def __init__(self, initial_size, min_size=1, max_size=250, max_rows=SHOPIFYQL_ROW_LIMIT,
+                 max_seconds=60.0, headroom=0.9, smoothing=0.5):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.headroom = headroom
+        self.smoothing = smoothing
+        self.size = max(min_size, min(initial_size, max_size))
+        self._per_item = {}
+        self._lock = threading.Lock()
+
+    def next_size(self):
+        with self._lock:
+            return self.size
+
+    def _smooth(self, name, value):
+        previous = self._per_item.get(name)
+        self._per_item[name] = value if previous is None else self.smoothing * value + (1 - self.smoothing) * previous
+
+    def observe(self, n_items, rows, stats=None):
+        """
+        Record one finished batch and resize.
+
+        Returns:
+            bool: True if the response reached the row limit and may be truncated
+        """
+        stats = stats or {}
+        truncated = rows >= self.max_rows
+        with self._lock:
+            if truncated:
+                self.size = max(self.min_size, min(self.size, n_items // 2))
+                logger.warning("Batch of %s items hit the %s row limit; batch size now %s", n_items, self.max_rows, self.size)
+                return True
+
+            self._smooth('rows', rows / n_items)
+            if not stats.get('cached'):
+                if stats.get('query_cost'):
+                    self._smooth('cost', float(stats['query_cost']) / n_items)
+                if stats.get('seconds'):
+                    self._smooth('seconds', stats['seconds'] / n_items)
+
+            # A response of exactly `max_rows` counts as truncated, so rows
+            # aim just below the limit; the row count is known, so no headroom
+            ceilings = {'rows': self.max_rows - 1,
+                        'cost': self.headroom * query_scheduler.maximum_available,
+                        'seconds': self.headroom * self.max_seconds}
+            limits = [ceilings[name] / per_item for name, per_item in self._per_item.items() if per_item > 0]
+            target = int(min(limits)) if limits else self.max_size
+            self.size = max(self.min_size, min(target, self.max_size, 2 * self.size))
+            logger.debug("Batch size now %s (per item: %s)", self.size, self._per_item)
+            return False
+
+    def timed_out(self, n_items):
+        """
+        Record a batch whose query timed out and shrink below its size.
+
+        The batch took longer than `max_seconds`, so the per-item time
+        estimate is raised to at least that, keeping later batches from
+        growing straight back to the size that timed out.
+        """
+        with self._lock:
+            self._per_item['seconds'] = max(self._per_item.get('seconds', 0), self.max_seconds / n_items)
+            self.size = max(self.min_size, min(self.size, n_items // 2))
+            logger.warning("Batch of %s items timed out; batch size now %s", n_items, self.size)
+
+
+def execute_adaptive_batches(items, fetch, batcher, on_result, max_workers=1, max_attempts=2):
+    """
+    Split `items` into batches sized by `batcher` and run `fetch` over them.
+
+    Batches are cut just before they are dispatched, so each one uses the
+    latest size estimate. Batches that may have been truncated, or whose
+    query hit a read timeout, are split in half and re-run.
+
+    Args:
+        items: Sequence of items to batch
+        fetch: Callable taking a tuple of items and returning `(result, stats)`,
+            where `len(result)` is the number of rows the query returned
+        batcher: `AdaptiveBatcher` deciding batch sizes
+        on_result: Callable taking `(batch, result)` for every complete batch,
+            called from the calling thread
+        max_workers: Max batches in flight at once
+        max_attempts: Attempts per batch before it is reported as failed
+
+    Raises:
+        BatchExecutionError: If any batch fails on every attempt, keyed by
+            the batch's first item and carrying the completed batches
+    """
+    retry_queue = deque()
+    position = 0
+    completed = []
+    failures = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        running = {}
+        while True:
+            while len(running) < max(1, max_workers) and (retry_queue or position < len(items)):
+                if retry_queue:
+                    batch, attempt = retry_queue.popleft()
+                else:
+                    batch = tuple(items[position:position + batcher.next_size()])
+                    position += len(batch)
+                    attempt = 1
+                running[executor.submit(fetch, batch)] = (batch, attempt)
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch, attempt = running.pop(future)
+                try:
+                    result, stats = future.result()
+                except Exception as e:
+                    if isinstance(e, requests.ReadTimeout) and len(batch) > 1:
+                        # Like truncation, a timeout means the batch was too big
+                        batcher.timed_out(len(batch))
+                        half = len(batch) // 2
+                        retry_queue.extend([(batch[:half], attempt), (batch[half:], attempt)])
+                        continue
+                    logger.warning("Batch starting at %s failed on attempt %s/%s: %s", batch[0], attempt, max_attempts, e)
+                    if attempt < max_attempts:
+                        retry_queue.append((batch, attempt + 1))
+                    else:
+                        failures[batch[0]] = e
+                    continue
+                if batcher.observe(len(batch), len(result), stats) and len(batch) > 1:
+                    half = len(batch) // 2
+                    retry_queue.extend([(batch[:half], attempt), (batch[half:], attempt)])
+                    continue
+                on_result(batch, result)
+                completed.append(batch)
+
+    if failures:
+        raise BatchExecutionError(failures, completed)
+
+
+def plan_month_windows(start_date, end_date, months_per_window):
+    """
+    Split a date range into consecutive month-aligned windows.
+
+    Windows start on the first of a month so that queries grouped by month
+    never split one month across two windows.
+
+    Returns:
+        list: `(start, end)` date tuples covering the range, end inclusive
+    """
+    windows = []
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min((window_start + relativedelta(months=months_per_window)).replace(day=1) - relativedelta(days=1), end_date)
+        windows.append((window_start, window_end))
+        window_start = window_end + relativedelta(days=1)
+    return windows
+
+
+def bisect_month_window(window):
+    """Split a window into two month-aligned halves, or return None for a single month."""
+    start_date, end_date = window
+    n_months = (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+    if n_months < 2:
+        return None
+    mid_date = (start_date + relativedelta(months=n_months // 2)).replace(day=1)
+    return [(start_date, mid_date - relativedelta(days=1)), (mid_date, end_date)]
+
+
+def fetch_date_window(window, fetch, row_limit, split_column=None):
+    """
+    Fetch one date window, bisecting it while it times out or hits `row_limit`.
+
+    A single-month window cannot be bisected further. If it still hits the
+    row limit it is paged by `split_column` instead: the response must be
+    ordered by that column, the last (possibly partial) value is dropped,
+    and the next page is fetched from that value onwards.
+
+    Args:
+        window: `(start, end)` date tuple
+        fetch: Callable taking `(start, end)` and returning ShopifyQL
+            `tableData`. With `split_column`, it must also accept a
+            `split_from` keyword restricting rows to values >= `split_from`.
+        row_limit: Row count at which a response is treated as truncated
+        split_column: Optional column the response is ordered by, used to
+            page single-month windows
+
+    Returns:
+        list: `tableData` for the window or its sub-windows, in date order
+
+    Raises:
+        requests.ReadTimeout: If a single-month window still times out
+        requests.RequestException: On any other request failure
+        ValueError: If a single-month window hits the row limit and cannot
+            be paged by `split_column`
+    """
+    try:
+        table_data = fetch(*window)
+    except requests.ReadTimeout:
+        # Network failures were already retried by the retry policy and are
+        # not a sign of an oversized window, so only read timeouts split
+        halves = bisect_month_window(window)
+        if halves is None:
+            raise
+        logger.warning("Window %s to %s timed out, splitting", window[0], window[1])
+        return [part for half in halves for part in fetch_date_window(half, fetch, row_limit, split_column)]
+
+    if len(table_data.get('rows') or []) >= row_limit:
+        halves = bisect_month_window(window)
+        if halves is not None:
+            logger.warning("Window %s to %s hit the %s row limit, splitting", window[0], window[1], row_limit)
+            return [part for half in halves for part in fetch_date_window(half, fetch, row_limit, split_column)]
+        if split_column is None:
+            raise ValueError(f"Single-month window {window[0]} to {window[1]} hit the {row_limit} row limit")
+        return _page_by_column(window, fetch, row_limit, split_column, table_data)
+
+    return [table_data]
+
+
+def _page_by_column(window, fetch, row_limit, split_column, table_data):
+    pages = []
+    while len(table_data.get('rows') or []) >= row_limit:
+        rows = table_data['rows']
+        last_value = rows[-1][split_column]
+        if rows[0][split_column] == last_value:
+            raise ValueError(f"{row_limit} rows for {split_column}={last_value!r} in {window[0]} to {window[1]}; cannot page further")
+        logger.warning("Window %s to %s hit the %s row limit, paging from %s=%r",
+                       window[0], window[1], row_limit, split_column, last_value)
+        pages.append({**table_data, 'rows': [row for row in rows if row[split_column] != last_value]})
+        table_data = fetch(*window, split_from=last_value)
+    pages.append(table_data)
+    return pages
+
+
 def create_date_table(year):
     """
     Creates a date table for an entire year with various date dimensions.
@@ -24,107 +521,231 @@ def create_date_table(year):
     Returns:
     pd.DataFrame: A DataFrame containing date dimension columns
     """
-    # Create date range for the entire year
-    start_date = datetime(year, 1, 1)
-    end_date = datetime(year, 12, 31)
-    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    
-    # Create the date table
-    date_table = pd.DataFrame({
-        'date': date_range,
-        'year_month': date_range.to_period('M'),
-        'quarter': date_range.to_series().apply(lambda x: f"Q{(x.month - 1) // 3 + 1}_{x.year}").values,        
-        'week_number': date_range.isocalendar().week
-    })
-    
-    date_table = date_table.reset_index(drop=True)
+    return build_date_dimension(date(year, 1, 1), date(year, 12, 31))
 
-    return date_table
 
+IDENTIFIER_COLUMNS = ('product_title', 'product_variant', 'product_variant_sku')
 
-def get_sales_df(table_data):
 
-        product_title = list(map(itemgetter('product_title'), table_data['rows']))
-        product_variant_title = list(map(itemgetter('product_variant_title'), table_data['rows']))
-        product_variant_sku = list(map(itemgetter('product_variant_sku'), table_data['rows']))
-        orders = list(map(itemgetter('orders'), table_data['rows']))
-        net_sales = list(map(itemgetter('net_sales'), table_data['rows']))
-        average_order_value = list(map(itemgetter('average_order_value'), table_data['rows']))
+class IdentifierDictionary:
+    """
+    Process-wide string dictionary for product identifier columns.
 
-        sales_dict = {'product_title': product_title,
-                    'product_variant': product_variant_title,
-                    'product_variant_sku': product_variant_sku,
-                    'orders': orders,
-                    'net_sales': net_sales,
-                    'average_order_value': average_order_value}
-        sales_df = pd.DataFrame(sales_dict)
+    Product titles, variants and SKUs repeat on every row (52 times per SKU
+    in the weekly frame), so they are stored as categoricals whose codes
+    index into one shared dictionary per column. `encode` appends unseen
+    values as batches are decoded; `unify` recasts a frame to the full,
+    lexically sorted dictionary so frames from different batches concat and
+    merge on matching integer codes and sort in the same order as strings.
+    """
 
-        sales_df['orders']=sales_df['orders'].astype(int)
-        sales_df['net_sales']=sales_df['net_sales'].astype(float)
-        sales_df['average_order_value']=sales_df['average_order_value'].astype(float)
+    def __init__(self):
+        self._lookups = {}
+        self._sorted_dtypes = {}
+        self._lock = threading.Lock()
 
-        sales_df = sales_df.reset_index(drop=True)
+    def encode(self, column, values):
+        """Encode `values` as a categorical over `column`'s dictionary."""
+        codes, uniques = pd.factorize(values)
+        with self._lock:
+            lookup = self._lookups.setdefault(column, {})
+            n_before = len(lookup)
+            ids = np.fromiter((lookup.setdefault(value, len(lookup)) for value in uniques), dtype=np.int64, count=len(uniques))
+            if len(lookup) != n_before:
+                self._sorted_dtypes.pop(column, None)
+            dtype = pd.CategoricalDtype(list(lookup))
+        mapped = np.full(len(codes), -1, dtype=np.int64)
+        mapped[codes >= 0] = ids[codes[codes >= 0]]
+        return pd.Categorical.from_codes(mapped, dtype=dtype)
 
-        return sales_df
+    def dtype(self, column):
+        """Return the sorted CategoricalDtype covering every value seen for `column`."""
+        with self._lock:
+            if column not in self._sorted_dtypes:
+                self._sorted_dtypes[column] = pd.CategoricalDtype(sorted(self._lookups.get(column, {})))
+            return self._sorted_dtypes[column]
 
+    def unify(self, df):
+        """
+        Return a copy of `df` with every identifier column recast to the
+        shared sorted dictionary. The caller's frame is left unchanged.
+        """
+        df = df.copy(deep=False)
+        for column in IDENTIFIER_COLUMNS:
+            if column in df.columns:
+                self.encode(column, df[column])
+        for column in IDENTIFIER_COLUMNS:
+            if column in df.columns:
+                # Unordered categorical dtypes compare equal regardless of
+                # category order, so astype alone would not re-sort them
+                df[column] = df[column].astype('category').cat.set_categories(self.dtype(column).categories)
+        return df
 
-def get_inventory_df(table_data):
 
-        product_variant_sku = list(map(itemgetter('product_variant_sku'), table_data['rows']))
-        inventory_units_sold = list(map(itemgetter('inventory_units_sold'), table_data['rows']))
-        ending_inventory_units = list(map(itemgetter('ending_inventory_units'), table_data['rows']))
+identifiers = IdentifierDictionary()
 
-        inventory_dict = {'product_variant_sku': product_variant_sku,
-                        'inventory_sold_last_60days': inventory_units_sold,
-                        'current_available_inventory_units': ending_inventory_units}
-        inventory_df = pd.DataFrame(inventory_dict)
 
-        inventory_df['inventory_sold_last_60days']=inventory_df['inventory_sold_last_60days'].astype(int)
-        inventory_df['current_available_inventory_units']=inventory_df['current_available_inventory_units'].astype(int)
-        inventory_df = inventory_df.reset_index(drop=True)
+# Maps ShopifyQL `dataType` values to the decoder's column types
+SHOPIFYQL_DTYPES = {
+    'INTEGER': 'int',
+    'NUMBER': 'float',
+    'FLOAT': 'float',
+    'MONEY': 'float',
+    'PERCENT': 'float',
+    'STRING': 'str',
+    'DAY': 'date',
+    'WEEK': 'date',
+    'MONTH': 'date',
+    'DAY_TIMESTAMP': 'date',
+    'WEEK_TIMESTAMP': 'date',
+    'MONTH_TIMESTAMP': 'date',
+}
 
-        return inventory_df
+NUMPY_DTYPES = {
+    'int': np.int64,
+    'float': np.float64,
+    'str': object,
+}
 
 
+def decode_table_data(table_data, columns):
+    """
+    Decode ShopifyQL `tableData` into a typed DataFrame.
 
-def get_inventory_weekly_agg_df(table_data):
+    Each column is filled straight from the response rows into a typed NumPy
+    buffer, without building an intermediate Python list and re-casting it.
+
+    Args:
+        table_data: `tableData` dict returned by `run_shopifyQL_query`
+        columns: Column specs as `(source, name, dtype)` tuples. `source` is
+            the ShopifyQL column, `name` the output column and `dtype` one of
+            'int', 'float', 'str', 'date' or 'category'. 'category' encodes
+            the column against the shared `identifiers` dictionary. A `dtype`
+            of None falls back to the `dataType` reported in the response's
+            column metadata.
+
+    Returns:
+        pd.DataFrame: One column per spec, in spec order
+    """
+    rows = table_data.get('rows') or []
+    n_rows = len(rows)
+    data_types = {column['name']: column.get('dataType') for column in table_data.get('columns') or []}
+
+    data = {}
+    for source, name, dtype in columns:
+        dtype = dtype or SHOPIFYQL_DTYPES.get(data_types.get(source), 'str')
+        values = map(itemgetter(source), rows)
+        if dtype == 'date':
+            data[name] = pd.to_datetime(np.fromiter(values, dtype=object, count=n_rows)).date
+        elif dtype == 'category':
+            data[name] = identifiers.encode(name, np.fromiter(values, dtype=object, count=n_rows))
+        else:
+            data[name] = np.fromiter(values, dtype=NUMPY_DTYPES[dtype], count=n_rows)
+
+    return pd.DataFrame(data)
+
+
+SALES_COLUMNS = [
+    ('product_title', 'product_title', 'category'),
+    ('product_variant_title', 'product_variant', 'category'),
+    ('product_variant_sku', 'product_variant_sku', 'category'),
+    ('orders', 'orders', 'int'),
+    ('net_sales', 'net_sales', 'float'),
+    ('average_order_value', 'average_order_value', 'float'),
+]
+
+INVENTORY_COLUMNS = [
+    ('product_variant_sku', 'product_variant_sku', 'category'),
+    ('inventory_units_sold', 'inventory_sold_last_60days', 'int'),
+    ('ending_inventory_units', 'current_available_inventory_units', 'int'),
+]
+
+INVENTORY_WEEKLY_AGG_COLUMNS = [
+    ('product_variant_sku', 'product_variant_sku', 'category'),
+    ('total_active_weeks', 'active_weeks', None),
+    ('total_out_of_stock_weeks', 'out_of_stock_weeks', None),
+    ('avg_weekly_sales', 'avg_weekly_sales', None),
+]
+
+SKU_CHANNEL_SALES_COLUMNS = [
+    ('product_variant_sku', 'product_variant_sku', 'category'),
+    ('orders', 'tiktok_meta_orders', 'int'),
+    ('net_sales', 'tiktok_meta_net_sales', 'float'),
+]
+
+SALES_BY_CHANNEL_COLUMNS = [
+    ('product_title', 'product_title', 'category'),
+    ('sales_channel', 'sales_channel', 'str'),
+    ('orders', 'orders', 'int'),
+    ('quantity_returned', 'quantity_returned', 'int'),
+    ('net_sales', 'net_sales', 'float'),
+    ('average_order_value', 'average_order_value', 'float'),
+]
+
+INVENTORY_CHANNEL_COLUMNS = [
+    ('product_title', 'product_title', 'category'),
+    ('product_variant_title', 'product_variant', 'category'),
+    ('product_variant_sku', 'product_variant_sku', 'category'),
+    ('inventory_units_sold', 'inventory_units_sold', 'int'),
+    ('ending_inventory_units', 'ending_inventory_units', 'int'),
+    ('days_out_of_stock', 'days_out_of_stock', 'int'),
+    ('sell_through_rate', 'sell_through_rate', 'float'),
+]
+
+
+# Derived 0/1 inventory flags, each a rule over the
+# (inventory_units_sold, ending_inventory_units) arrays
+WEEKLY_INVENTORY_FLAGS = {
+    'active_weeks': lambda sold, ending: sold > 0,
+    'inactive_weeks': lambda sold, ending: (ending > 0) & (sold == 0),
+    'out_of_stock_weeks': lambda sold, ending: ending < 0,
+}
+
+CHANNEL_INVENTORY_FLAGS = {
+    'out_of_stock_sku': lambda sold, ending: ending == 0,
+}
+
+
+def add_inventory_flags(df, flags):
+    """
+    Add derived 0/1 flag columns to an inventory frame.
+
+    The source columns are pulled out as NumPy arrays once and every flag is
+    evaluated as a vectorized rule over them, instead of a row-wise
+    `DataFrame.apply` per flag.
+
+    Args:
+        df: Frame with `inventory_units_sold` and `ending_inventory_units`
+        flags: Mapping of output column to rule, e.g. `WEEKLY_INVENTORY_FLAGS`
 
-        product_variant_sku = list(map(itemgetter('product_variant_sku'), table_data['rows']))        
-        inventory_units_sold = list(map(itemgetter('total_inventory_sold'), table_data['rows']))
-        total_active_weeks = list(map(itemgetter('total_active_weeks'), table_data['rows']))
-        total_out_of_stock_weeks = list(map(itemgetter('total_out_of_stock_weeks'), table_data['rows']))
-        avg_weekly_sales = list(map(itemgetter('avg_weekly_sales'), table_data['rows']))
+    Returns:
+        pd.DataFrame: `df` with the flag columns added as int64
+    """
+    sold = df['inventory_units_sold'].to_numpy()
+    ending = df['ending_inventory_units'].to_numpy()
+    for name, rule in flags.items():
+        df[name] = rule(sold, ending).astype(np.int64)
+    return df
+
+
+def get_sales_df(table_data):
+
+        return decode_table_data(table_data, SALES_COLUMNS)
 
 
+def get_inventory_df(table_data):
 
-        inventory_weekly_agg_dict = {'product_variant_sku': product_variant_sku,                        
-                        'inventory_units_sold': inventory_units_sold,
-                        'active_weeks': total_active_weeks,
-                        'out_of_stock_weeks': total_out_of_stock_weeks,
-                        'avg_weekly_sales': avg_weekly_sales}
-        
-        inventory_weekly_agg_df = pd.DataFrame(inventory_weekly_agg_dict)
-        inventory_agg_data = inventory_weekly_agg_df[['product_variant_sku','active_weeks', 'out_of_stock_weeks', 'avg_weekly_sales']].reset_index(drop=True)
+        return decode_table_data(table_data, INVENTORY_COLUMNS)
 
-        return inventory_agg_data
 
+def get_inventory_weekly_agg_df(table_data):
 
-def get_sku_channel_sales_df(table_data):        
-       
-        product_variant_sku = list(map(itemgetter('product_variant_sku'), table_data['rows']))        
-        orders = list(map(itemgetter('orders'), table_data['rows']))
-        net_sales = list(map(itemgetter('net_sales'), table_data['rows']))
+        return decode_table_data(table_data, INVENTORY_WEEKLY_AGG_COLUMNS)
 
-        sku_channel_sales_dict = {'product_variant_sku': product_variant_sku,                
-                'tiktok_meta_orders': orders,               
-                'tiktok_meta_net_sales': net_sales}
-        sku_channel_sales_df = pd.DataFrame(sku_channel_sales_dict)
 
-        sku_channel_sales_df['tiktok_meta_orders']=sku_channel_sales_df['tiktok_meta_orders'].astype(int)        
-        sku_channel_sales_df['tiktok_meta_net_sales']=sku_channel_sales_df['tiktok_meta_net_sales'].astype(float)        
-        sku_channel_sales_df = sku_channel_sales_df.reset_index(drop=True)
+def get_sku_channel_sales_df(table_data):
 
-        return sku_channel_sales_df
+        return decode_table_data(table_data, SKU_CHANNEL_SALES_COLUMNS)
 
 # def get_inventory_weekly_df(table_data):
 
@@ -159,67 +780,78 @@ def get_sku_channel_sales_df(table_data):
 #         return inventory_agg_data
 
 
-def get_sales_by_channel_df(table_data):        
-       
-        product_title = list(map(itemgetter('product_title'), table_data['rows']))
-        sales_channel = list(map(itemgetter('sales_channel'), table_data['rows']))
-        orders = list(map(itemgetter('orders'), table_data['rows']))
-        quantity_returned = list(map(itemgetter('quantity_returned'), table_data['rows']))
-        net_sales = list(map(itemgetter('net_sales'), table_data['rows']))
-        average_order_value = list(map(itemgetter('average_order_value'), table_data['rows']))
-
-        channel_sales_dict = {'product_title': product_title,
-                'sales_channel': sales_channel,
-                'orders': orders,
-                'quantity_returned': quantity_returned,               
-                'net_sales': net_sales,
-                'average_order_value': average_order_value}
-        channel_sales_df = pd.DataFrame(channel_sales_dict)
-
-        channel_sales_df['orders']=channel_sales_df['orders'].astype(int)
-        channel_sales_df['quantity_returned']=channel_sales_df['quantity_returned'].astype(int)
-        channel_sales_df['net_sales']=channel_sales_df['net_sales'].astype(float)
-        channel_sales_df['average_order_value']=channel_sales_df['average_order_value'].astype(float)
-
-        channel_sales_df = channel_sales_df.reset_index(drop=True)
-
-        return channel_sales_df
-
-
-def get_inventory_for_channel_products_df(table_data):        
-       
-        product_title = list(map(itemgetter('product_title'), table_data['rows']))
-        product_variant_title = list(map(itemgetter('product_variant_title'), table_data['rows']))
-        product_variant_sku = list(map(itemgetter('product_variant_sku'), table_data['rows']))
-        inventory_units_sold = list(map(itemgetter('inventory_units_sold'), table_data['rows']))
-        ending_inventory_units = list(map(itemgetter('ending_inventory_units'), table_data['rows']))
-        days_out_of_stock = list(map(itemgetter('days_out_of_stock'), table_data['rows']))
-        sell_through_rate = list(map(itemgetter('sell_through_rate'), table_data['rows']))
-
-        inventory_channel_dict = {'product_title': product_title,
-                                'product_variant': product_variant_title,
-                                'product_variant_sku': product_variant_sku,
-                                'inventory_units_sold': inventory_units_sold,
-                                'ending_inventory_units': ending_inventory_units,
-                                'days_out_of_stock': days_out_of_stock,
-                                'sell_through_rate': sell_through_rate
-                                }
-        inventory_channel_df = pd.DataFrame(inventory_channel_dict)
-
-        inventory_channel_df['inventory_units_sold']=inventory_channel_df['inventory_units_sold'].astype(int)
-        inventory_channel_df['ending_inventory_units']=inventory_channel_df['ending_inventory_units'].astype(int)        
-        inventory_channel_df['days_out_of_stock']=inventory_channel_df['days_out_of_stock'].astype(int)        
-        inventory_channel_df['sell_through_rate']=inventory_channel_df['sell_through_rate'].astype(float)
-        inventory_channel_df['out_of_stock_sku'] = inventory_channel_df.apply(lambda x : 1 if (x['ending_inventory_units']==0) else 0, axis=1) 
-
-        inventory_channel_df = inventory_channel_df.reset_index(drop=True)
-        return inventory_channel_df
-
-
-def get_consolidated_df(df_list):
-
-    consolidated_df = functools.reduce(lambda left, right: pd.merge(left, right, on='product_variant_sku', how='left'), df_list)
-    consolidated_df = consolidated_df.fillna(0)
+def get_sales_by_channel_df(table_data):
+
+        return decode_table_data(table_data, SALES_BY_CHANNEL_COLUMNS)
+
+
+def get_inventory_for_channel_products_df(table_data):
+
+        inventory_channel_df = decode_table_data(table_data, INVENTORY_CHANNEL_COLUMNS)
+
+        return add_inventory_flags(inventory_channel_df, CHANNEL_INVENTORY_FLAGS)
+
+
+def get_consolidated_df(df_list, key='product_variant_sku', fill_values=None):
+    """
+    Left-join every frame in `df_list` onto the first one by `key`.
+
+    The key is encoded once as integer codes over the first frame's keys;
+    each other frame is then aligned to it by integer code and all columns
+    are assembled in a single concat, instead of a chain of pairwise merges
+    that re-hash the key and copy the growing frame per input. Missing keys
+    get a slot of their own, so as with `merge` they match each other.
+
+    Args:
+        df_list: Frames to combine; the first one defines the output rows
+        key: Join column present in every frame
+        fill_values: Optional per-column values for rows with no match.
+            Numeric columns default to 0; other columns are left missing.
+
+    Returns:
+        pd.DataFrame: One row per row of the first frame
+
+    Raises:
+        ValueError: If two frames share a non-key column
+    """
+    base = df_list[0].reset_index(drop=True)
+    # Missing keys get code -1, which indexes the extra last slot of
+    # `positions` below
+    keys = pd.Index(pd.unique(base[key].dropna()))
+    base_codes = keys.get_indexer(base[key])
+
+    columns = set(base.columns)
+    parts = [base]
+    for df in df_list[1:]:
+        overlap = columns.intersection(df.columns) - {key}
+        if overlap:
+            raise ValueError(f"Columns {sorted(overlap)} appear in more than one frame")
+        columns.update(df.columns)
+
+        duplicated = df[key].duplicated()
+        if duplicated.any():
+            # A left merge would fan these out into multiple rows per key
+            logger.warning("%s duplicate %s values in frame with columns %s, keeping first: %s",
+                           duplicated.sum(), key, list(df.columns), df.loc[duplicated, key].unique()[:5].tolist())
+            df = df[~duplicated]
+        df = df.reset_index(drop=True)
+
+        codes = keys.get_indexer(df[key])
+        matched = codes >= 0
+        positions = np.full(len(keys) + 1, -1)
+        positions[codes[matched]] = np.flatnonzero(matched)
+        missing = np.flatnonzero(df[key].isna().to_numpy())
+        if len(missing):
+            positions[-1] = missing[0]
+        parts.append(df.drop(columns=key).reindex(positions[base_codes]).reset_index(drop=True))
+
+    consolidated_df = pd.concat(parts, axis=1)
+
+    fill_values = dict(fill_values or {})
+    for column in consolidated_df.columns:
+        if column not in fill_values and pd.api.types.is_numeric_dtype(consolidated_df[column]):
+            fill_values[column] = 0
+    consolidated_df = consolidated_df.fillna(fill_values)
 
     return consolidated_df
 
@@ -233,3 +865,162 @@ def load_bigquery_table(final_df, table_name):
                table_id=table_name,
                if_exists='replace'
                )
+
+
+def load_dense_product_month_table(final_df, table_name):
+        """
+        Load densified monthly product sales, replacing a view of the same name.
+        """
+        drop_bigquery_table(p_id, d_id, table_name, table_type='VIEW')
+        load_bigquery_table(final_df, table_name)
+
+
+def publish_dense_product_month_view(sparse_df, table_name, start_date, end_date):
+        """
+        Load sparse monthly product sales and densify them at query time.
+
+        The observed rows go to `<table_name>_sparse`, and `table_name`
+        becomes a view filling every month of the load window with zeros.
+
+        Args:
+            sparse_df: Observed monthly sales rows
+            table_name: Name of the dense view
+            start_date: First day of the load window
+            end_date: Last day of the load window
+        """
+        sparse_table = f"{table_name}_sparse"
+        load_bigquery_table(sparse_df, sparse_table)
+        replace_bigquery_view(p_id, d_id, table_name, qry.get_dense_product_month_query(
+               bigquery_table_ref(sparse_table), start_date, end_date
+               ))
+
+
+def load_bigquery_tables(tables):
+        """
+        Load several tables to BigQuery at once.
+
+        Args:
+            tables: Mapping of table name to DataFrame
+
+        Returns:
+            dict: Per-table rows, bytes and load duration
+        """
+        logger.info("Loading tables %s to BigQuery", ", ".join(tables))
+        return write_dataframes_to_bigquery(
+               frames=tables,
+               project_id=p_id,
+               dataset_id=d_id,
+               if_exists='replace'
+               )
+
+
+def stream_bigquery_table(chunks, table_name):
+        logger.info("Streaming table %s to BigQuery", table_name)
+        return stream_dataframes_to_bigquery(
+               chunks=chunks,
+               project_id=p_id,
+               dataset_id=d_id,
+               table_id=table_name,
+               if_exists='replace'
+               )
+
+
+def merge_bigquery_table(final_df, table_name, key_columns, delete_before=None):
+        logger.info("Merging into table %s on %s", table_name, key_columns)
+        merge_dataframe_to_bigquery(
+               df=final_df,
+               project_id=p_id,
+               dataset_id=d_id,
+               table_id=table_name,
+               key_columns=key_columns,
+               delete_before=delete_before
+               )
+
+
+def bigquery_table_ref(table_name):
+        return f"{p_id}.{d_id}.{table_name}"
+
+
+def get_weekly_watermarks(table_name):
+        """
+        Read the latest stored week per SKU from a weekly table.
+
+        Returns:
+            dict: SKU to its latest `week` as a date; empty if the table does not exist yet
+        """
+        try:
+            watermark_df = read_dataframe_from_bigquery(qry.get_weekly_watermark_query(bigquery_table_ref(table_name)))
+        except NotFound:
+            logger.info("Table %s not found, running a full load", table_name)
+            return {}
+        return dict(zip(watermark_df['product_variant_sku'], pd.to_datetime(watermark_df['last_week']).dt.date))
+
+
+def write_parquet_table(df, out_dir, table_name, compression='snappy', row_group_size=None,
+                        partition_by=None, date_column=None):
+        """
+        Write a table to local Parquet.
+
+        Args:
+            df: DataFrame to write
+            out_dir: Output directory
+            table_name: File name (or dataset directory name when partitioned)
+            compression: Parquet codec ('snappy', 'zstd', 'gzip', 'brotli' or 'none')
+            row_group_size: Max rows per row group
+            partition_by: Optional 'month' or 'week'; writes a hive-style
+                dataset partitioned on `date_column` truncated to that period
+            date_column: Date column used for partitioning
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        compression = None if compression == 'none' else compression
+
+        if not partition_by:
+            path = os.path.join(out_dir, f"{table_name}.parquet")
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path,
+                           compression=compression, row_group_size=row_group_size)
+            logger.info("Wrote %s rows to %s", len(df), path)
+            return
+
+        dates = pd.to_datetime(df[date_column])
+        partition_column = f"{partition_by}_partition"
+        if partition_by == 'month':
+            partition_values = dates.dt.strftime('%Y-%m')
+        else:
+            partition_values = (dates - pd.to_timedelta(dates.dt.weekday, unit='D')).dt.strftime('%Y-%m-%d')
+        table = pa.Table.from_pandas(df.assign(**{partition_column: partition_values}), preserve_index=False)
+
+        path = os.path.join(out_dir, table_name)
+        file_options = ds.ParquetFileFormat().make_write_options(compression=compression)
+        ds.write_dataset(table, path, format='parquet', file_options=file_options,
+                         partitioning=[partition_column], partitioning_flavor='hive',
+                         max_rows_per_group=row_group_size or 1024 * 1024,
+                         min_rows_per_group=0,
+                         existing_data_behavior='delete_matching')
+        logger.info("Wrote %s rows to %s partitioned by %s", len(df), path, partition_by)
+
+
+def refresh_sku_weekly_agg():
+        """
+        Rebuild the per-SKU aggregate table from the weekly inventory table.
+
+        Run after every weekly load, so the daily job reads the small
+        aggregate instead of scanning the full weekly history.
+        """
+        logger.info("Refreshing table %s", SKU_WEEKLY_AGG_TABLE)
+        run_bigquery_statement(qry.get_sku_weekly_agg_refresh_query(
+               bigquery_table_ref(WEEKLY_INVENTORY_TABLE),
+               bigquery_table_ref(SKU_WEEKLY_AGG_TABLE)
+               ))
+
+
+def read_sku_weekly_agg():
+        """
+        Read the per-SKU weekly aggregates, building the table first if it
+        does not exist yet.
+        """
+        query = qry.get_inventory_agg_query(bigquery_table_ref(SKU_WEEKLY_AGG_TABLE))
+        try:
+            return read_dataframe_from_bigquery(query)
+        except NotFound:
+            refresh_sku_weekly_agg()
+            return read_dataframe_from_bigquery(query)
@@ -0,0 +1,90 @@
+import os
+import argparse
+import functools
+import logging
+from datetime import date
+import pandas as pd
+from dotenv import load_dotenv
+from access_functions import write_dataframe_to_bigquery
+
+load_dotenv()
+
+p_id = os.getenv("GCP_PROJECT_ID")
+d_id = os.getenv("BIGQUERY_DATASET_ID")
+FISCAL_YEAR_START_MONTH = int(os.getenv("FISCAL_YEAR_START_MONTH", "1"))
+DATE_DIMENSION_TABLE = 'date_dimension'
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=32)
+def _build_date_dimension(start_date, end_date, fiscal_year_start_month):
+    dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    iso = dates.isocalendar()
+    year = dates.year
+    month = dates.month
+
+    # Fiscal years are named after the calendar year they end in
+    fiscal_offset = (month - fiscal_year_start_month) % 12
+    fiscal_year = year + ((fiscal_year_start_month != 1) & (month >= fiscal_year_start_month))
+
+    return pd.DataFrame({
+        'date': dates,
+        'year_month': dates.to_period('M'),
+        'quarter': 'Q' + dates.quarter.astype(str) + '_' + year.astype(str),
+        'week_number': iso['week'].to_numpy(),
+        'year': year,
+        'month': dates.to_period('M').to_timestamp().date,
+        'iso_year': iso['year'].to_numpy(),
+        'fiscal_year': fiscal_year,
+        'fiscal_quarter': fiscal_offset // 3 + 1,
+        'fiscal_month': fiscal_offset + 1,
+    })
+
+
+def build_date_dimension(start_date, end_date, fiscal_year_start_month=FISCAL_YEAR_START_MONTH):
+    """
+    Build a date dimension table for an arbitrary date range.
+
+    All dimension columns are computed with vectorized DatetimeIndex
+    accessors. Results are memoized per range, so repeated calls within a
+    run only pay for a copy.
+
+    Parameters:
+    start_date (date): First day of the range
+    end_date (date): Last day of the range (inclusive)
+    fiscal_year_start_month (int): Month the fiscal year starts in
+
+    Returns:
+    pd.DataFrame: One row per day with date dimension columns
+    """
+    return _build_date_dimension(start_date, end_date, fiscal_year_start_month).copy()
+
+
+def publish_date_dimension(start_date, end_date, table_name=DATE_DIMENSION_TABLE):
+    """
+    Write the date dimension for a range to BigQuery, replacing the table.
+    """
+    date_table = build_date_dimension(start_date, end_date)
+    date_table['year_month'] = date_table['year_month'].astype(str)
+    logger.info("Publishing %s days to table %s", len(date_table), table_name)
+    write_dataframe_to_bigquery(
+        df=date_table,
+        project_id=p_id,
+        dataset_id=d_id,
+        table_id=table_name,
+        if_exists='replace'
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--table", default=DATE_DIMENSION_TABLE)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    args = parse_args()
+    publish_date_dimension(args.start, args.end, args.table)
@@ -1,13 +1,14 @@
 import os
+import asyncio
 import argparse
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
 import shopify
-from access_functions import get_access_token_oauth, connect_to_shopify, run_shopifyQL_query, read_dataframe_from_bigquery
+from access_functions import get_access_token_oauth, configure_http_client, configure_query_cache, connect_to_shopify, run_shopifyQL_query_async
 import core_functions as core
 import queries as qry
-import time
+from pipeline import Pipeline
 
 load_dotenv()
 
@@ -29,80 +30,109 @@ def setup_logging(log_path="logs/run.log"):
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--output", choices=["bigquery", "csv"], default="bigquery")
+    parser.add_argument("--output", choices=["bigquery", "csv", "parquet"], default="bigquery")
     parser.add_argument("--csv-dir", default="output")
+    parser.add_argument("--parquet-dir", default="output")
+    parser.add_argument("--parquet-compression", choices=["snappy", "zstd", "gzip", "brotli", "none"], default="zstd")
+    parser.add_argument("--row-group-size", type=int, default=None, help="Max rows per Parquet row group")
+    parser.add_argument("--http-timeout", type=float, default=300, help="Read timeout in seconds for Shopify requests")
+    parser.add_argument("--cache-dir", default=None, help="Cache ShopifyQL responses on disk here")
+    parser.add_argument("--run-dir", default=None, help="Keep stage outputs and timings here and reuse them on the next run")
+    parser.add_argument("--rerun", nargs="+", default=[], metavar="STAGE", help="Recompute these stages (and their dependents) instead of reusing --run-dir outputs")
     return parser.parse_args()
 
 
-def main(access_token=None):
-    """Main function to pull and analyze inventory data"""
-    try:
-        # Connect to Shopify
-        connect_to_shopify(access_token)
-        logger.info("Running sales query")
-        sales_query = qry.get_all_sku_sales_query()
-        sales_data = run_shopifyQL_query(sales_query, access_token)
-        sales_df = core.get_sales_df(sales_data)
-        skus = sales_df['product_variant_sku'].unique()
-        skus.sort()
-        skus_sorted = tuple(skus)
-        logger.info("Sales rows: %s", sales_df.shape)
-
-
-        logger.info("Running top-selling query")
-        top_seller_query = qry.get_top_selling_query()
-        top_seller_data = run_shopifyQL_query(top_seller_query, access_token)
-        top_seller_df = core.get_sales_df(top_seller_data)
-        top_seller_df = top_seller_df[['product_variant_sku', 'net_sales']].rename(columns={'net_sales': 'net_sales_14days'}).reset_index(drop=True)
-
-        logger.info("Running inventory query")
-        inventory_query = qry.get_inventory_query(skus_sorted)
-        inventory_data = run_shopifyQL_query(inventory_query, access_token)
-        inventory_df = core.get_inventory_df(inventory_data)
-        logger.info("Inventory rows: %s", inventory_df.shape)
-
-        logger.info("Running inventory weekly query")
-        inventory_weekly_agg_query = qry.get_inventory_agg_query()
-        inventory_weekly_agg_data = read_dataframe_from_bigquery(inventory_weekly_agg_query)
-        inventory_weekly_agg_df = inventory_weekly_agg_data[['product_variant_sku','active_weeks', 'out_of_stock_weeks', 'avg_weekly_sales']].reset_index(drop=True)        
-        logger.info("Inventory weekly rows: %s", inventory_weekly_agg_df.shape)
-
-        logger.info("Running all-sku channel sales query")
-        all_sku_channel_sales_query = qry.get_all_sku_channel_sales_query()
-        all_sku_channel_sales_data = run_shopifyQL_query(all_sku_channel_sales_query, access_token)
-        all_sku_channel_sales_df = core.get_sku_channel_sales_df(all_sku_channel_sales_data)
-        logger.info("All SKU channel sales rows: %s", all_sku_channel_sales_df.shape)
-
-        logger.info("Running channel sales query")
-        sales_by_channel_query = qry.get_channel_sales_query()
-        sales_by_channel_data = run_shopifyQL_query(sales_by_channel_query, access_token)
-        channel_sales_df = core.get_sales_by_channel_df(sales_by_channel_data)
-        products= tuple(channel_sales_df['product_title'].unique())
-
-        logger.info("Sleeping for 10 seconds to avoid rate limits...")
-        time.sleep(600)  # Sleep to avoid hitting rate limits
-
-        logger.info("Running channel inventory query")
-        channel_inventory_query = qry.get_channel_inventory_query(products)
-        inventory_by_channel_data = run_shopifyQL_query(channel_inventory_query, access_token)
-        channel_inventory_df = core.get_inventory_for_channel_products_df(inventory_by_channel_data)
-        
-        out_of_stock_df = channel_inventory_df[channel_inventory_df['out_of_stock_sku']==1].reset_index(drop=True)
-        out_of_stock_df = out_of_stock_df.fillna(0)
-        
-        channel_inventory_agg = channel_inventory_df.groupby(['product_title'], as_index=False).agg({'product_variant_sku':'count',
+OUTPUT_TABLES = ('top_sku_data', 'channel_sales_data', 'out_of_stock_data')
+
+
+def build_pipeline(access_token):
+    """
+    Declare the daily queries and transforms as pipeline stages.
+
+    Each query stage only waits for the stages it names as inputs, so the
+    independent queries run concurrently: inventory waits for the sales
+    SKUs and channel inventory for the channel sales products.
+    """
+    pipeline = Pipeline("fith_bigquery")
+
+    async def fetch_df(query, build):
+        data = await run_shopifyQL_query_async(query, access_token)
+        return await asyncio.to_thread(build, data)
+
+    @pipeline.stage()
+    async def sales():
+        return await fetch_df(qry.get_all_sku_sales_query(), core.get_sales_df)
+
+    @pipeline.stage()
+    async def top_seller():
+        top_seller_df = await fetch_df(qry.get_top_selling_query(), core.get_sales_df)
+        return top_seller_df[['product_variant_sku', 'net_sales']].rename(columns={'net_sales': 'net_sales_14days'}).reset_index(drop=True)
+
+    @pipeline.stage(inputs=['sales'])
+    async def inventory(sales):
+        skus_sorted = tuple(sorted(sales['product_variant_sku'].unique()))
+        return await fetch_df(qry.get_inventory_query(skus_sorted), core.get_inventory_df)
+
+    @pipeline.stage()
+    def inventory_weekly_agg():
+        inventory_weekly_agg_data = core.read_sku_weekly_agg()
+        return inventory_weekly_agg_data[['product_variant_sku','active_weeks', 'out_of_stock_weeks', 'avg_weekly_sales']].reset_index(drop=True)
+
+    @pipeline.stage()
+    async def all_sku_channel_sales():
+        return await fetch_df(qry.get_all_sku_channel_sales_query(), core.get_sku_channel_sales_df)
+
+    @pipeline.stage()
+    async def channel_sales():
+        return await fetch_df(qry.get_channel_sales_query(), core.get_sales_by_channel_df)
+
+    @pipeline.stage(inputs=['channel_sales'])
+    async def channel_inventory(channel_sales):
+        products = tuple(channel_sales['product_title'].unique())
+        return await fetch_df(qry.get_channel_inventory_query(products), core.get_inventory_for_channel_products_df)
+
+    @pipeline.stage(inputs=['channel_inventory'])
+    def out_of_stock_data(channel_inventory):
+        out_of_stock_df = channel_inventory[channel_inventory['out_of_stock_sku']==1].reset_index(drop=True)
+        # Identifier columns are categoricals, so only numeric gaps are filled
+        numeric_columns = out_of_stock_df.select_dtypes('number').columns
+        out_of_stock_df[numeric_columns] = out_of_stock_df[numeric_columns].fillna(0)
+        return out_of_stock_df
+
+    @pipeline.stage(inputs=['channel_sales', 'channel_inventory'])
+    def channel_sales_data(channel_sales, channel_inventory):
+        channel_inventory_agg = channel_inventory.groupby(['product_title'], as_index=False, observed=True).agg({'product_variant_sku':'count',
                                                                                      'out_of_stock_sku': sum,
                                                                                      'inventory_units_sold': sum}).rename(columns={'product_variant_sku':'active_sku_count'}).reset_index(drop=True)
-        
-        channel_consolidated_df = channel_sales_df.merge(channel_inventory_agg, how='left', on='product_title')
-        channel_consolidated_df = channel_consolidated_df[['product_title', 'sales_channel', 'inventory_units_sold', 
-                                                       'orders', 'quantity_returned', 'net_sales', 'average_order_value', 
-                                                       'active_sku_count', 'out_of_stock_sku']]
 
+        channel_consolidated_df = core.identifiers.unify(channel_sales).merge(core.identifiers.unify(channel_inventory_agg), how='left', on='product_title')
+        return channel_consolidated_df[['product_title', 'sales_channel', 'inventory_units_sold',
+                                        'orders', 'quantity_returned', 'net_sales', 'average_order_value',
+                                        'active_sku_count', 'out_of_stock_sku']]
+
+    @pipeline.stage(inputs=['sales', 'top_seller', 'inventory', 'inventory_weekly_agg', 'all_sku_channel_sales'])
+    def top_sku_data(sales, top_seller, inventory, inventory_weekly_agg, all_sku_channel_sales):
         # Merge DataFrames
-        df_list = [sales_df, top_seller_df, inventory_df, inventory_weekly_agg_df, all_sku_channel_sales_df]
-        final_df = core.get_consolidated_df(df_list)
-        
+        df_list = [sales, top_seller, inventory, inventory_weekly_agg, all_sku_channel_sales]
+        return core.get_consolidated_df(df_list)
+
+    return pipeline
+
+
+def main(access_token=None, run_dir=None, rerun=()):
+    """
+    Main function to pull and analyze inventory data
+
+    With a `run_dir`, stage outputs and timings are kept there and stages
+    already computed are reused; stages named in `rerun` (and everything
+    downstream of them) are recomputed.
+    """
+    try:
+        # Connect to Shopify
+        connect_to_shopify(access_token)
+        run = build_pipeline(access_token).run(OUTPUT_TABLES, run_dir=run_dir, rerun=rerun)
+        final_df, channel_consolidated_df, out_of_stock_df = (run.outputs[name] for name in OUTPUT_TABLES)
+
         return final_df, channel_consolidated_df, out_of_stock_df 
 
     except Exception as e:
@@ -115,17 +145,26 @@ def main(access_token=None):
 if __name__ == "__main__":
     setup_logging()
     args = parse_args()
+    configure_http_client(read_timeout=args.http_timeout)
+    if args.cache_dir:
+        configure_query_cache(args.cache_dir)
     # Step 1: Get Access Token
     access_token = get_access_token_oauth(SHOP_URL)
     
     # Step 2: Call Main Function
-    df, channel_df, out_of_stock_df = main(access_token)    
+    df, channel_df, out_of_stock_df = main(access_token, run_dir=args.run_dir, rerun=args.rerun)    
 
     # Step 3: Load Data to BigQuery
     if args.output == "bigquery":
-        core.load_bigquery_table(df, 'top_sku_data')
-        core.load_bigquery_table(channel_df, 'channel_sales_data')
-        core.load_bigquery_table(out_of_stock_df, 'out_of_stock_data')
+        core.load_bigquery_tables({
+            'top_sku_data': df,
+            'channel_sales_data': channel_df,
+            'out_of_stock_data': out_of_stock_df
+        })
+    elif args.output == "parquet":
+        for table_name, table_df in [('top_sku_data', df), ('channel_sales_data', channel_df), ('out_of_stock_data', out_of_stock_df)]:
+            core.write_parquet_table(table_df, args.parquet_dir, table_name,
+                                     compression=args.parquet_compression, row_group_size=args.row_group_size)
     else:
         os.makedirs(args.csv_dir, exist_ok=True)
         df.to_csv(os.path.join(args.csv_dir, "top_sku_data.csv"), index=False)
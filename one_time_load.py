@@ -1,13 +1,15 @@
 import os
 import argparse
 import logging
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from dotenv import load_dotenv
 import shopify
-from operator import itemgetter
-from access_functions import get_access_token_oauth, connect_to_shopify, run_shopifyQL_query
+from access_functions import get_access_token_oauth, configure_http_client, configure_query_cache, connect_to_shopify, run_shopifyQL_query, query_fingerprint
 import core_functions as core
+from queries import quote_string
+from date_dimension import build_date_dimension
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
@@ -16,56 +18,93 @@ load_dotenv()
 SHOP_URL = os.getenv("SHOP_URL")
 logger = logging.getLogger(__name__)
 
-## Six-Month window dates
 today = datetime.today().date()
 
-## Splitting Data into Three 4-Month Periods
-first_st_date = (today - relativedelta(months=12)).replace(day=1)
-first_end_date = (first_st_date + relativedelta(months=4)).replace(day=1) - relativedelta(days=1)
-second_st_date = first_end_date + relativedelta(days=1)
-second_end_date = (second_st_date + relativedelta(months=4)).replace(day=1) - relativedelta(days=1)
-third_st_date = second_end_date + relativedelta(days=1)
-third_end_date = (third_st_date + relativedelta(months=4)).replace(day=1) - relativedelta(days=1)
+## Twelve full months, fetched in month-aligned windows
+start_date = (today - relativedelta(months=12)).replace(day=1)
+end_date = (start_date + relativedelta(months=12)) - relativedelta(days=1)
+ROW_LIMIT = core.SHOPIFYQL_ROW_LIMIT
 
-# end_date = today.replace(day=1) - relativedelta(days=1)
-
-dates_list = [(first_st_date, first_end_date), (second_st_date, second_end_date), (third_st_date, third_end_date)]
+dates_list = core.plan_month_windows(start_date, end_date, 4)
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--output", choices=["bigquery", "csv"], default="bigquery")
+    parser.add_argument("--output", choices=["bigquery", "csv", "parquet"], default="bigquery")
     parser.add_argument("--csv-dir", default="output")
+    parser.add_argument("--parquet-dir", default="output")
+    parser.add_argument("--parquet-compression", choices=["snappy", "zstd", "gzip", "brotli", "none"], default="zstd")
+    parser.add_argument("--row-group-size", type=int, default=None, help="Max rows per Parquet row group")
+    parser.add_argument("--partition-by", choices=["month", "week"], default=None, help="Write a hive-style Parquet dataset partitioned by period")
+    parser.add_argument("--http-timeout", type=float, default=300, help="Read timeout in seconds for Shopify requests")
+    parser.add_argument("--cache-dir", default=None, help="Cache ShopifyQL responses on disk here")
+    parser.add_argument("--window-months", type=int, default=4, help="Months per ShopifyQL window before any splitting")
+    parser.add_argument("--max-in-flight", type=int, default=3, help="Max date windows queried concurrently")
+    parser.add_argument("--no-densify", action="store_true", help="Skip filling missing product months; load the observed rows to all_sku_data_sparse and densify them in the all_sku_data view")
+    parser.add_argument("--spill-dir", default=None, help="Spill fetched windows to Parquet here instead of holding them in memory")
+    parser.add_argument("--checkpoint-dir", default=None, help="Checkpoint finished windows here so a failed run can be resumed")
+    parser.add_argument("--run-id", default=today.isoformat(), help="Checkpoint run to resume (default: today's date)")
     return parser.parse_args()
 
 
-def cross_join_date_table(df):
+PRODUCT_KEYS = ['product_title', 'product_variant', 'product_variant_sku']
+MONTHLY_VALUE_COLUMNS = ['net_items_sold', 'orders', 'quantity_returned', 'net_sales', 'gross_sales', 'discounts', 'net_returns']
+
+
+def cross_join_date_table(df, densify=True):
     """
-    Cross Join Date Table with Sales Data
+    Densify Sales Data to one row per product per month.
+
+    Products are sorted once and numbered, and the sales rows are reindexed
+    onto the (product, month) MultiIndex with zeros for missing months. This
+    avoids materializing a separate product x month cross join, outer
+    merging it back and re-sorting the result.
+
+    Args:
+        df: Monthly sales rows
+        densify: When False, return only the observed rows (sorted) and
+            leave filling missing months to query time in BigQuery, see
+            `core_functions.publish_dense_product_month_view`
     """
-    date_table = core.create_date_table(2025)
-    date_table['month']=pd.to_datetime(date_table['year_month'].dt.to_timestamp()).dt.date
-    df_months = date_table[['month']].drop_duplicates().reset_index(drop=True)
-    df_unique = df[['product_title','product_variant','product_variant_sku']].drop_duplicates().reset_index(drop=True)
-    product_months = df_unique.merge(df_months, how='cross')
-    df_final = df.merge(product_months, on=['product_title','product_variant','product_variant_sku', 'month'], how='outer')
-    df_final = df_final[['product_title', 'product_variant', 'product_variant_sku', 'month', 'net_items_sold', 'orders',
-                         'quantity_returned', 'net_sales', 'gross_sales', 'discounts', 'net_returns']].fillna(0)
-    df_final = df_final.sort_values(by=['product_title','product_variant_sku','month']).reset_index(drop=True)    
+    products = df[PRODUCT_KEYS].drop_duplicates().sort_values(by=['product_title', 'product_variant_sku'])
+    products = products.reset_index(drop=True)
+    product_codes = pd.MultiIndex.from_frame(products).get_indexer(pd.MultiIndex.from_frame(df[PRODUCT_KEYS]))
+
+    if not densify:
+        order = np.lexsort((df['month'].to_numpy(), product_codes))
+        return df[PRODUCT_KEYS + ['month'] + MONTHLY_VALUE_COLUMNS].iloc[order].reset_index(drop=True)
+
+    date_table = build_date_dimension(dates_list[0][0], dates_list[-1][1])
+    months = sorted(set(date_table['month']).union(df['month']))
+
+    observed = df[MONTHLY_VALUE_COLUMNS].set_axis(pd.MultiIndex.from_arrays([product_codes, df['month']]))
+    if observed.index.has_duplicates:
+        raise ValueError("Sales data has more than one row per product and month")
+    dense_index = pd.MultiIndex.from_product([np.arange(len(products)), months])
+    dense_values = observed.reindex(dense_index, fill_value=0).reset_index(drop=True)
+
+    df_final = products.iloc[np.repeat(np.arange(len(products)), len(months))].reset_index(drop=True)
+    df_final['month'] = np.tile(np.array(months, dtype=object), len(products))
+    df_final = pd.concat([df_final, dense_values], axis=1)
 
     return df_final
 
 
-def get_product_sales_query(start_date, end_date):
+def get_product_sales_query(start_date, end_date, title_from=None):
     """
     Get Query for Top-10 SKU by sales in last 14 days.
+
+    With `title_from`, only products titled `title_from` or later are
+    returned, to page a window that exceeds the row limit.
     """
+    title_filter = f"AND product_title >= {quote_string(title_from)}" if title_from is not None else ""
     final_query = fr"""
         FROM sales
         SHOW net_items_sold, orders, net_sales, gross_sales, discounts, returns,
             average_order_value, quantity_returned
         WHERE line_type = 'product'
             AND product_variant_sku IS NOT NULL
+            {title_filter}
         GROUP BY month, product_title, product_variant_title, product_variant_sku
         HAVING net_items_sold > 0
         SINCE {start_date} UNTIL {end_date}
@@ -87,70 +126,71 @@ def setup_logging(log_path="logs/one_time_run.log"):
     )
 
 
-def transform_yearly_data(table_data):        
-       
-        product_title = list(map(itemgetter('product_title'), table_data['rows']))
-        product_variant = list(map(itemgetter('product_variant_title'), table_data['rows']))
-        product_variant_sku = list(map(itemgetter('product_variant_sku'), table_data['rows']))
-        net_items_sold = list(map(itemgetter('net_items_sold'), table_data['rows']))
-        gross_sales = list(map(itemgetter('gross_sales'), table_data['rows']))
-        discounts = list(map(itemgetter('discounts'), table_data['rows']))
-        returns = list(map(itemgetter('returns'), table_data['rows']))
-        orders = list(map(itemgetter('orders'), table_data['rows']))
-        quantity_returned = list(map(itemgetter('quantity_returned'), table_data['rows']))
-        net_sales = list(map(itemgetter('net_sales'), table_data['rows']))
-        average_order_value = list(map(itemgetter('average_order_value'), table_data['rows']))
-        month = list(map(itemgetter('month'), table_data['rows']))        
-
-        transformed_dict = {'product_title': product_title,
-                'product_variant': product_variant,
-                'product_variant_sku': product_variant_sku,
-                'month': month,
-                'net_items_sold': net_items_sold,
-                'gross_sales': gross_sales,
-                'discounts': discounts,
-                'net_returns': returns,
-                'orders': orders,
-                'quantity_returned': quantity_returned,               
-                'net_sales': net_sales,
-                'average_order_value': average_order_value}
-        t_df = pd.DataFrame(transformed_dict)
-
-        t_df['net_items_sold']=t_df['net_items_sold'].astype(int)
-        t_df['orders']=t_df['orders'].astype(int)                    
-        t_df['quantity_returned']=t_df['quantity_returned'].astype(int)    
-        t_df['net_returns']=t_df['net_returns'].astype(float)    
-        t_df['average_order_value']=t_df['average_order_value'].astype(float)
-        t_df['net_sales']=t_df['net_sales'].astype(float)
-        t_df['gross_sales']=t_df['gross_sales'].astype(float)
-        t_df['discounts']=t_df['discounts'].astype(float)
-        t_df['month']=pd.to_datetime(t_df['month']).dt.date
-
-
-        t_df = t_df.reset_index(drop=True)
-
-        return t_df
-
-
-def main(access_token=None):
-    """Main function to pull and analyze inventory data"""
+YEARLY_SALES_COLUMNS = [
+    ('product_title', 'product_title', 'category'),
+    ('product_variant_title', 'product_variant', 'category'),
+    ('product_variant_sku', 'product_variant_sku', 'category'),
+    ('month', 'month', 'date'),
+    ('net_items_sold', 'net_items_sold', 'int'),
+    ('gross_sales', 'gross_sales', 'float'),
+    ('discounts', 'discounts', 'float'),
+    ('returns', 'net_returns', 'float'),
+    ('orders', 'orders', 'int'),
+    ('quantity_returned', 'quantity_returned', 'int'),
+    ('net_sales', 'net_sales', 'float'),
+    ('average_order_value', 'average_order_value', 'float'),
+]
+
+
+def transform_yearly_data(table_data):
+
+        return core.decode_table_data(table_data, YEARLY_SALES_COLUMNS)
+
+
+def main(access_token=None, spill_dir=None, densify=True, window_months=4, max_in_flight=1, checkpoint=None):
+    """
+    Main function to pull and analyze inventory data
+
+    With a `core.CheckpointStore`, finished windows are checkpointed there
+    and windows already completed by an earlier attempt are skipped.
+    """
     try:
         # Connect to Shopify
         connect_to_shopify(access_token)
         logger.info("Running yearly-data query")
         
-        transformed_df = pd.DataFrame()
+        collector = checkpoint if checkpoint is not None else core.ChunkCollector(spill_dir=spill_dir)
+        windows = core.plan_month_windows(start_date, end_date, window_months)
+
+        def window_hash(window):
+            return query_fingerprint(get_product_sales_query(*window))
+
+        pending = list(enumerate(windows))
+        if checkpoint is not None:
+            checkpoint.retain(window[0].isoformat() for window in windows)
+            pending = [(i, window) for i, window in pending if not checkpoint.is_done(window[0].isoformat(), window_hash(window))]
+            logger.info("Resuming with %s of %s windows left", len(pending), len(windows))
+
+        def fetch(st_dt, end_dt, split_from=None):
+            product_sales_query = get_product_sales_query(st_dt, end_dt, title_from=split_from)
+            return run_shopifyQL_query(product_sales_query, access_token)
 
-        for st_dt, end_dt in dates_list:
+        def fetch_window(indexed_window):
+            i, window = indexed_window
+            parts = core.fetch_date_window(window, fetch, ROW_LIMIT, split_column='product_title')
+            part_df = pd.concat([transform_yearly_data(year_sales_data) for year_sales_data in parts], ignore_index=True)
+            if checkpoint is not None:
+                checkpoint.add(part_df, key=window[0].isoformat(), query_hash=window_hash(window))
+            else:
+                collector.add(part_df, key=i)
+            logger.info("Window %s to %s rows: %s (%s queries)", window[0], window[1], len(part_df), len(parts))
 
-            product_sales_query = get_product_sales_query(st_dt, end_dt)
-            year_sales_data = run_shopifyQL_query(product_sales_query, access_token)
-            part_df = transform_yearly_data(year_sales_data)              
-            transformed_df = pd.concat([transformed_df, part_df], ignore_index=True)
+        core.execute_batches(pending, fetch_window, max_workers=max_in_flight)
 
-        transformed_df = transformed_df.reset_index(drop=True)
+        # Windows are month-aligned and disjoint; drop any repeated rows defensively
+        transformed_df = collector.to_frame().drop_duplicates(subset=PRODUCT_KEYS + ['month']).reset_index(drop=True)
 
-        full_df = cross_join_date_table(transformed_df)
+        full_df = cross_join_date_table(transformed_df, densify=densify)
 
         return full_df
 
@@ -168,11 +208,16 @@ if __name__ == "__main__":
     setup_logging()
 
     args = parse_args()
+    configure_http_client(read_timeout=args.http_timeout)
+    if args.cache_dir:
+        configure_query_cache(args.cache_dir)
     # Step 1: Get Access Token
     access_token = get_access_token_oauth(SHOP_URL)
     
     # Step 2: Call Main Function
-    df = main(access_token)
+    checkpoint = core.CheckpointStore(args.checkpoint_dir, args.run_id) if args.checkpoint_dir else None
+    df = main(access_token, spill_dir=args.spill_dir, densify=not args.no_densify,
+              window_months=args.window_months, max_in_flight=args.max_in_flight, checkpoint=checkpoint)
 
     '''
     NOTE: 
@@ -182,8 +227,16 @@ if __name__ == "__main__":
     '''
     # Step 3: Load Data to BigQuery
     if args.output == "bigquery":
-        core.load_bigquery_table(df, 'all_sku_data')
-        pass
+        if args.no_densify:
+            core.publish_dense_product_month_view(df, 'all_sku_data', start_date, end_date)
+        else:
+            core.load_dense_product_month_table(df, 'all_sku_data')
+    elif args.output == "parquet":
+        core.write_parquet_table(df, args.parquet_dir, 'all_sku_yearly_data',
+                                 compression=args.parquet_compression, row_group_size=args.row_group_size,
+                                 partition_by=args.partition_by, date_column='month')
     else:
         os.makedirs(args.csv_dir, exist_ok=True)
         df.to_csv(os.path.join(args.csv_dir, "all_sku_yearly_data.csv"), index=False)
+    if checkpoint is not None:
+        checkpoint.commit()
@@ -0,0 +1,212 @@
+import asyncio
+import inspect
+import json
+import logging
+import time
+from pathlib import Path
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    One named step of a `Pipeline`.
+
+    Args:
+        name: Stage name, also the name its output is passed under
+        func: Callable (sync or async) taking the outputs of `inputs` as
+            keyword arguments
+        inputs: Names of the stages whose outputs this stage needs
+    """
+
+    def __init__(self, name, func, inputs=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+
+
+class Pipeline:
+    """
+    Declarative DAG of named stages.
+
+    Stages declare their inputs by name. `run` executes every stage needed
+    for the requested targets, starting each one as soon as its inputs are
+    ready, so independent stages overlap. Sync stages run in worker threads
+    and async stages on the event loop. Each output is computed once per
+    run and shared by all its consumers.
+
+    With a `run_dir`, DataFrame outputs are also written there as Parquet
+    together with `stages.json`, which holds the wall time, rows and bytes
+    of every stage. A later run with the same `run_dir` loads those outputs
+    instead of recomputing them, so a single stage can be rerun by naming
+    it in `rerun`. That stage and everything downstream of it are
+    recomputed; everything else is reused.
+
+    Args:
+        name: Pipeline name, used in logs
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+
+    def add(self, name, func, inputs=()):
+        """Register `func` as stage `name`."""
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already defined")
+        self.stages[name] = Stage(name, func, inputs)
+        return func
+
+    def stage(self, name=None, inputs=()):
+        """Decorator registering a function as a stage, named after it by default."""
+        def decorator(func):
+            return self.add(name or func.__name__, func, inputs)
+        return decorator
+
+    def _required(self, targets):
+        required = []
+        visiting = set()
+
+        def visit(name, path):
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage '{name}' (needed by {' -> '.join(path) or 'targets'})")
+            if name in required:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle in pipeline '{self.name}': {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for input_name in self.stages[name].inputs:
+                visit(input_name, path + [name])
+            visiting.discard(name)
+            required.append(name)
+
+        for target in targets:
+            visit(target, [])
+        return required
+
+    def _stale(self, required, rerun):
+        stale = set(rerun)
+        for name in required:
+            if any(input_name in stale for input_name in self.stages[name].inputs):
+                stale.add(name)
+        return stale
+
+    async def run_async(self, targets=None, run_dir=None, rerun=()):
+        """
+        Run the stages needed for `targets` (default: every stage).
+
+        Args:
+            targets: Names of the stages whose outputs are wanted
+            run_dir: Optional directory to persist and reuse stage outputs
+            rerun: Stages to recompute even if `run_dir` holds their output
+
+        Returns:
+            PipelineRun: Outputs and per-stage metrics of the run
+        """
+        targets = list(targets or self.stages)
+        unknown = [name for name in rerun if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown stage(s) to rerun: {unknown}")
+        required = self._required(targets)
+        stale = self._stale(required, rerun)
+        run = PipelineRun(self.name, run_dir)
+
+        # Stages that can be reused from `run_dir` don't need their inputs
+        reusable = {name for name in required if name not in stale and run.has(name)}
+        needed = set(targets)
+        for name in reversed(required):
+            if name in needed and name not in reusable:
+                needed.update(self.stages[name].inputs)
+        tasks = {}
+
+        async def execute(stage):
+            if stage.name in reusable:
+                return run.load(stage.name)
+            kwargs = {}
+            for input_name in stage.inputs:
+                kwargs[input_name] = await tasks[input_name]
+            started = time.perf_counter()
+            logger.info("Running stage %s", stage.name)
+            if inspect.iscoroutinefunction(stage.func):
+                output = await stage.func(**kwargs)
+            else:
+                output = await asyncio.to_thread(stage.func, **kwargs)
+            run.record(stage.name, output, time.perf_counter() - started)
+            return output
+
+        for name in (name for name in required if name in needed):
+            tasks[name] = asyncio.create_task(execute(self.stages[name]))
+        try:
+            await asyncio.gather(*tasks.values())
+        except Exception:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        finally:
+            run.save_metrics()
+
+        run.outputs = {name: tasks[name].result() for name in targets}
+        run.log_report()
+        return run
+
+    def run(self, targets=None, run_dir=None, rerun=()):
+        """Blocking wrapper around `run_async`."""
+        return asyncio.run(self.run_async(targets, run_dir, rerun))
+
+
+class PipelineRun:
+    """
+    Outputs and per-stage metrics of one `Pipeline` run.
+
+    Args:
+        pipeline_name: Name of the pipeline being run
+        run_dir: Optional directory holding persisted stage outputs
+    """
+
+    def __init__(self, pipeline_name, run_dir=None):
+        self.pipeline_name = pipeline_name
+        self.run_dir = Path(run_dir) if run_dir else None
+        self.outputs = {}
+        self.metrics = {}
+        self.ran = []
+        if self.run_dir:
+            self.run_dir.mkdir(parents=True, exist_ok=True)
+            metrics_path = self.run_dir / "stages.json"
+            if metrics_path.exists():
+                self.metrics = json.loads(metrics_path.read_text(encoding="utf-8"))
+
+    def _output_path(self, name):
+        return self.run_dir / f"{name}.parquet"
+
+    def has(self, name):
+        """Return True if `run_dir` holds a persisted output of stage `name`."""
+        return self.run_dir is not None and self._output_path(name).exists()
+
+    def load(self, name):
+        """Return the persisted output of stage `name`."""
+        logger.info("Reusing stage %s from %s", name, self.run_dir)
+        self.metrics.setdefault(name, {})['reused'] = True
+        return pd.read_parquet(self._output_path(name))
+
+    def record(self, name, output, seconds):
+        """Record the metrics of a computed stage and persist its output."""
+        rows = len(output) if isinstance(output, pd.DataFrame) else None
+        nbytes = int(output.memory_usage(deep=True).sum()) if isinstance(output, pd.DataFrame) else None
+        self.metrics[name] = {'seconds': round(seconds, 3), 'rows': rows, 'bytes': nbytes, 'reused': False}
+        self.ran.append(name)
+        logger.info("Stage %s finished in %.2fs (%s rows, %s bytes)", name, seconds, rows, nbytes)
+        if self.run_dir is not None and isinstance(output, pd.DataFrame):
+            output.to_parquet(self._output_path(name), index=False)
+
+    def save_metrics(self):
+        """Write the per-stage metrics to `stages.json` in `run_dir`."""
+        if self.run_dir is None:
+            return
+        (self.run_dir / "stages.json").write_text(json.dumps(self.metrics, indent=2), encoding="utf-8")
+
+    def log_report(self):
+        """Log the stages computed in this run, slowest first."""
+        for name in sorted(self.ran, key=lambda name: -self.metrics[name]['seconds']):
+            m = self.metrics[name]
+            logger.info("%s stage %-24s %8.2fs %10s rows %12s bytes", self.pipeline_name, name, m['seconds'], m['rows'], m['bytes'])
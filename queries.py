@@ -10,6 +10,26 @@ start_date = (today - relativedelta(months=6)).replace(day=1)
 end_date = today.replace(day=1) - relativedelta(days=1)
 
 
+def quote_string(value):
+    """
+    Render a value as a single-quoted ShopifyQL string literal.
+
+    Backslashes and single quotes in the value are escaped, so titles
+    such as "Kid's Tee" stay one literal.
+    """
+    escaped = str(value).replace("\\", "\\\\").replace("'", "\\'")
+    return f"'{escaped}'"
+
+
+def format_in_list(values):
+    """
+    Render values as a parenthesised ShopifyQL list for an IN clause.
+
+    Each value is quoted with `quote_string`.
+    """
+    return "(" + ", ".join(quote_string(value) for value in values) + ")"
+
+
 # # Query-1
 def get_top_selling_query():
     """
@@ -49,28 +69,49 @@ def get_inventory_query(sku_list):
 
 
 # # Query-3
-def get_inventory_agg_query():
+def get_inventory_agg_query(agg_table_ref):
     """
-    Get inventory query from BigQuery table.    
+    Get per-SKU weekly inventory aggregates from the precomputed BigQuery table.
     Args:
-        [ 6-month period ]
-        start_date: Start date for the query 
-        end_date: End date for the query
+        agg_table_ref: Full reference of the table built by
+            `get_sku_weekly_agg_refresh_query`
     """
     final_query = fr"""
            select 
             product_variant_sku,             
-            sum(active_weeks) as active_weeks, 
-            sum(out_of_stock_weeks) as out_of_stock_weeks, 
-            round(sum(inventory_units_sold)/sum(active_weeks),2) as avg_weekly_sales
-                from `upwork-478017.fith_shopify_analytics.all_sku_weekly_inventory_data`
-            group by 1
+            active_weeks, 
+            out_of_stock_weeks, 
+            avg_weekly_sales
+                from `{agg_table_ref}`
             order by avg_weekly_sales desc;
         """
     
     return final_query
 
 
+# # Query-3a
+def get_sku_weekly_agg_refresh_query(weekly_table_ref, agg_table_ref):
+    """
+    Rebuild the per-SKU weekly inventory aggregate table.
+    Args:
+        weekly_table_ref: Full reference of the weekly inventory table
+        agg_table_ref: Full reference of the aggregate table to (re)create
+    """
+    final_query = fr"""
+           create or replace table `{agg_table_ref}` as
+           select 
+            product_variant_sku,             
+            sum(active_weeks) as active_weeks, 
+            sum(out_of_stock_weeks) as out_of_stock_weeks, 
+            sum(inventory_units_sold) as inventory_units_sold,
+            round(safe_divide(sum(inventory_units_sold), sum(active_weeks)),2) as avg_weekly_sales
+                from `{weekly_table_ref}`
+            group by 1;
+        """
+
+    return final_query
+
+
 # Query-3
 def get_all_sku_channel_sales_query():
     """
@@ -128,7 +169,7 @@ def get_channel_inventory_query(product_list):
         FROM inventory
         SHOW inventory_units_sold, ending_inventory_units, days_out_of_stock, sell_through_rate
         WHERE inventory_is_tracked = true
-        AND product_title IN {product_list}
+        AND product_title IN {format_in_list(product_list)}
         GROUP BY product_title, product_variant_title, product_variant_sku
         HAVING inventory_units_sold > 0
         SINCE startOfMonth(-2m) UNTIL endOfMonth(- 1m)
@@ -201,20 +242,82 @@ def get_all_sku_inventory_query():
 
 
 # Query-9
-def get_all_sku_weekly_inventory_query(sku_list):
+def get_all_sku_weekly_inventory_query(sku_list, since, until):
     """
     Get all sku-weeklyinventory query.
     Args:
-        [ 60-day period ]
+        sku_list: Comma-separated tuple of product SKUs
+        since: First day to fetch (the load window's start, or a SKU's
+            watermark in incremental mode)
+        until: Last day to fetch (the load window's end)
     """    
+    period = f"SINCE {since} UNTIL {until}"
     final_query = fr"""
         FROM inventory
         SHOW week, inventory_units_sold, ending_inventory_units
         WHERE inventory_is_tracked = true
-        AND product_variant_sku IN {sku_list}
+        AND product_variant_sku IN {format_in_list(sku_list)}
         GROUP BY week, product_variant_sku
-        DURING last_year
+        {period}
         ORDER BY product_variant_sku, week ASC
         """
     
-    return final_query
\ No newline at end of file
+    return final_query
+
+
+# Query-10
+def get_weekly_watermark_query(table_ref):
+    """
+    Get the latest stored week per SKU from the weekly inventory table.
+    Args:
+        table_ref: Full table reference in the format 'project.dataset.table'
+    """
+    final_query = fr"""
+           select
+            product_variant_sku,
+            max(week) as last_week
+                from `{table_ref}`
+            group by 1;
+        """
+
+    return final_query
+
+
+# Query-11
+def get_dense_product_month_query(sales_table_ref, start_date, end_date):
+    """
+    Densify sparse monthly product sales at query time.
+    Args:
+        sales_table_ref: Monthly sales table (loaded with --no-densify)
+        start_date: First day of the load window
+        end_date: Last day of the load window
+    """
+    final_query = fr"""
+           with months as (
+            select month
+                from unnest(generate_date_array(date_trunc(DATE '{start_date}', month), DATE '{end_date}', interval 1 month)) as month
+           ),
+           products as (
+            select distinct product_title, product_variant, product_variant_sku
+                from `{sales_table_ref}`
+           )
+           select
+            p.product_title,
+            p.product_variant,
+            p.product_variant_sku,
+            m.month,
+            coalesce(s.net_items_sold, 0) as net_items_sold,
+            coalesce(s.orders, 0) as orders,
+            coalesce(s.quantity_returned, 0) as quantity_returned,
+            coalesce(s.net_sales, 0) as net_sales,
+            coalesce(s.gross_sales, 0) as gross_sales,
+            coalesce(s.discounts, 0) as discounts,
+            coalesce(s.net_returns, 0) as net_returns
+                from products p
+                cross join months m
+                left join `{sales_table_ref}` s
+                    using (product_title, product_variant, product_variant_sku, month)
+            order by product_title, product_variant_sku, month
+        """
+
+    return final_query
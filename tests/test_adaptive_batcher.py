@@ -0,0 +1,113 @@
+import pytest
+import requests
+
+import core_functions as core
+
+
+@pytest.fixture(autouse=True)
+def query_budget(monkeypatch):
+    monkeypatch.setattr(core.query_scheduler, 'maximum_available', 1000.0)
+
+
+def test_rows_fill_the_limit_without_headroom():
+    batcher = core.AdaptiveBatcher(18, max_rows=1000)
+
+    # 53 weekly rows per SKU: 18 SKUs fit below 1000 rows, 19 do not
+    for _ in range(3):
+        assert not batcher.observe(batcher.size, 53 * batcher.size, {'query_cost': 1, 'seconds': 0.1})
+
+    assert batcher.size == 18
+
+
+def test_cost_and_time_keep_headroom():
+    batcher = core.AdaptiveBatcher(10, max_rows=10000, max_seconds=60.0, headroom=0.9)
+
+    batcher.observe(10, 10, {'query_cost': 100, 'seconds': 1})
+    assert batcher.size == 20  # growth is capped at 2x per step
+    batcher.observe(20, 20, {'query_cost': 200, 'seconds': 2})
+    assert batcher.size == 40
+    batcher.observe(40, 40, {'query_cost': 400, 'seconds': 4})
+    assert batcher.size == 80
+    batcher.observe(80, 80, {'query_cost': 800, 'seconds': 8})
+    assert batcher.size == 90  # 0.9 * 1000 budget / 10 cost per item
+
+
+def test_cached_responses_only_update_rows():
+    batcher = core.AdaptiveBatcher(10, max_rows=10000)
+
+    batcher.observe(10, 10, {'query_cost': 1000, 'seconds': 600, 'cached': True})
+
+    assert batcher.size == 20
+
+
+def test_truncated_response_halves_the_size():
+    batcher = core.AdaptiveBatcher(40, max_rows=1000)
+
+    assert batcher.observe(40, 1000)
+    assert batcher.size == 20
+
+
+def test_timeout_halves_the_size_and_slows_regrowth():
+    batcher = core.AdaptiveBatcher(40, max_rows=10000, max_seconds=60.0, headroom=0.9)
+
+    batcher.timed_out(40)
+    assert batcher.size == 20
+
+    batcher.observe(20, 20, {})
+    assert batcher.size == 36  # 0.9 * 40: the size that timed out is not reached again
+
+
+def test_size_stays_within_bounds():
+    batcher = core.AdaptiveBatcher(500, min_size=2, max_size=50, max_rows=1000)
+    assert batcher.size == 50
+
+    batcher.observe(50, 1000)
+    batcher.observe(25, 1000)
+    batcher.observe(12, 1000)
+    batcher.observe(6, 1000)
+    batcher.observe(3, 1000)
+    assert batcher.size == 2
+
+
+def run_batches(items, fetch, batcher, max_workers=1):
+    results = {}
+    core.execute_adaptive_batches(items, fetch, batcher, lambda batch, result: results.update({batch: result}),
+                                  max_workers=max_workers)
+    return results
+
+
+def test_truncated_batches_are_split_and_rerun():
+    def fetch(batch):
+        return [item for item in batch for _ in range(10)], {}
+
+    results = run_batches(list(range(20)), fetch, core.AdaptiveBatcher(20, max_rows=100))
+
+    assert sorted(item for batch in results for item in batch) == list(range(20))
+    assert all(len(result) < 100 for result in results.values())
+
+
+def test_timed_out_batches_are_split_and_rerun():
+    sizes = []
+
+    def fetch(batch):
+        sizes.append(len(batch))
+        if len(batch) > 4:
+            raise requests.ReadTimeout('too slow')
+        return list(batch), {}
+
+    results = run_batches(list(range(16)), fetch, core.AdaptiveBatcher(16, max_rows=1000))
+
+    assert sizes[:3] == [16, 8, 8]
+    assert sorted(item for batch in results for item in batch) == list(range(16))
+
+
+def test_failed_batches_are_reported_after_retries():
+    def fetch(batch):
+        if 3 in batch:
+            raise ValueError('bad batch')
+        return list(batch), {}
+
+    with pytest.raises(core.BatchExecutionError) as excinfo:
+        run_batches(list(range(6)), fetch, core.AdaptiveBatcher(2, max_size=2, max_rows=1000))
+
+    assert list(excinfo.value.failures) == [2]
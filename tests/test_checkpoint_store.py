@@ -0,0 +1,77 @@
+import json
+
+import pandas as pd
+import pandas.testing as pdt
+
+import core_functions as core
+
+
+def batch_df(*values):
+    return pd.DataFrame({'value': list(values)})
+
+
+def test_resume_keeps_completed_batches(tmp_path):
+    store = core.CheckpointStore(tmp_path, 'run-1')
+    store.add(batch_df(1, 2), key='a', query_hash='q1', items=['sku-1', 'sku-2'])
+    store.add(batch_df(3), key='b', query_hash='q2', items=['sku-3'])
+
+    resumed = core.CheckpointStore(tmp_path, 'run-1')
+
+    assert len(resumed) == 2
+    assert resumed.rows == 3
+    assert resumed.is_done('a', 'q1')
+    assert not resumed.is_done('a', 'q2')
+    assert resumed.completed_items() == {'sku-1', 'sku-2', 'sku-3'}
+    assert resumed.completed_items('q1') == {'sku-1', 'sku-2'}
+    pdt.assert_frame_equal(resumed.to_frame(), batch_df(1, 2, 3))
+
+
+def test_batches_are_assembled_in_key_order(tmp_path):
+    store = core.CheckpointStore(tmp_path, 'run-1')
+    store.add(batch_df(2), key='b', query_hash='q')
+    store.add(batch_df(1), key='a', query_hash='q')
+
+    assert [chunk['value'].tolist() for chunk in store] == [[1], [2]]
+
+
+def test_discard_drops_batches_and_their_files(tmp_path):
+    store = core.CheckpointStore(tmp_path, 'run-1')
+    store.add(batch_df(1), key='a', query_hash='q')
+    store.add(batch_df(2), key='b', query_hash='q')
+    dropped_file = tmp_path / 'run-1' / store.batches['a']['file']
+
+    store.discard(key for key in store.batches if key == 'a')
+
+    assert list(store.batches) == ['b']
+    assert not dropped_file.exists()
+    assert list(core.CheckpointStore(tmp_path, 'run-1').batches) == ['b']
+
+
+def test_retain_keeps_only_the_given_keys(tmp_path):
+    store = core.CheckpointStore(tmp_path, 'run-1')
+    for key in ('a', 'b', 'c'):
+        store.add(batch_df(1), key=key, query_hash='q')
+
+    store.retain(['a', 'c'])
+
+    assert sorted(store.batches) == ['a', 'c']
+
+
+def test_committed_run_starts_over(tmp_path):
+    store = core.CheckpointStore(tmp_path, 'run-1')
+    store.add(batch_df(1), key='a', query_hash='q')
+    batch_file = tmp_path / 'run-1' / store.batches['a']['file']
+    store.commit()
+    assert json.loads((tmp_path / 'run-1' / 'manifest.json').read_text())['committed']
+
+    restarted = core.CheckpointStore(tmp_path, 'run-1')
+
+    assert len(restarted) == 0
+    assert not batch_file.exists()
+    assert not json.loads((tmp_path / 'run-1' / 'manifest.json').read_text())['committed']
+
+
+def test_other_run_ids_are_independent(tmp_path):
+    core.CheckpointStore(tmp_path, 'run-1').add(batch_df(1), key='a', query_hash='q')
+
+    assert len(core.CheckpointStore(tmp_path, 'run-2')) == 0
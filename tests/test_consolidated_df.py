@@ -0,0 +1,56 @@
+import functools
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+import core_functions as core
+
+
+def legacy_consolidated_df(df_list):
+    """Chained left merges the aligned consolidation replaced."""
+    consolidated_df = functools.reduce(lambda left, right: pd.merge(left, right, on='product_variant_sku', how='left'), df_list)
+    numeric = consolidated_df.select_dtypes('number').columns
+    return consolidated_df.fillna({column: 0 for column in numeric})
+
+
+@pytest.fixture
+def frames():
+    base = pd.DataFrame({
+        'product_variant_sku': ['a', 'b', None, 'c', 'd'],
+        'product_title': ['A', 'B', 'No SKU', 'C', 'D'],
+    })
+    sales = pd.DataFrame({
+        'product_variant_sku': ['d', None, 'a', 'x'],
+        'net_sales': np.array([4.0, 9.0, 1.0, 7.0]),
+    })
+    inventory = pd.DataFrame({
+        'product_variant_sku': ['c', 'b', 'a'],
+        'ending_inventory_units': np.array([3, 2, 1], dtype=np.int64),
+    })
+    return [base, sales, inventory]
+
+
+def test_consolidated_df_matches_chained_merges(frames):
+    expected = legacy_consolidated_df(frames)
+    result = core.get_consolidated_df(frames)
+
+    pdt.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_missing_keys_match_each_other(frames):
+    result = core.get_consolidated_df(frames)
+
+    no_sku = result[result['product_variant_sku'].isna()]
+    assert no_sku['net_sales'].tolist() == [9.0]
+    assert no_sku['ending_inventory_units'].tolist() == [0]
+
+
+def test_missing_keys_without_a_match_are_filled():
+    base = pd.DataFrame({'product_variant_sku': ['a', np.nan], 'product_title': ['A', 'No SKU']})
+    sales = pd.DataFrame({'product_variant_sku': ['a'], 'net_sales': [5.0]})
+
+    result = core.get_consolidated_df([base, sales])
+
+    assert result['net_sales'].tolist() == [5.0, 0.0]
@@ -0,0 +1,39 @@
+from datetime import date
+
+from date_dimension import build_date_dimension
+
+
+def test_one_row_per_day_with_calendar_columns():
+    table = build_date_dimension(date(2024, 12, 30), date(2025, 1, 2))
+
+    assert len(table) == 4
+    assert table['month'].tolist() == [date(2024, 12, 1)] * 2 + [date(2025, 1, 1)] * 2
+    assert table['quarter'].tolist() == ['Q4_2024', 'Q4_2024', 'Q1_2025', 'Q1_2025']
+    # 2024-12-30 already falls in ISO week 1 of 2025
+    assert table['week_number'].tolist() == [1, 1, 1, 1]
+    assert table['iso_year'].tolist() == [2025] * 4
+    assert table['year'].tolist() == [2024, 2024, 2025, 2025]
+
+
+def test_fiscal_year_is_named_after_the_year_it_ends_in():
+    table = build_date_dimension(date(2025, 3, 31), date(2025, 4, 1), fiscal_year_start_month=4)
+
+    assert table['fiscal_year'].tolist() == [2025, 2026]
+    assert table['fiscal_quarter'].tolist() == [4, 1]
+    assert table['fiscal_month'].tolist() == [12, 1]
+
+
+def test_calendar_fiscal_year_matches_the_calendar():
+    table = build_date_dimension(date(2025, 1, 1), date(2025, 12, 31), fiscal_year_start_month=1)
+
+    assert (table['fiscal_year'] == table['year']).all()
+    assert (table['fiscal_month'] == table['date'].dt.month).all()
+
+
+def test_memoized_results_are_copies():
+    first = build_date_dimension(date(2025, 1, 1), date(2025, 1, 31))
+    first['year'] = 0
+
+    second = build_date_dimension(date(2025, 1, 1), date(2025, 1, 31))
+
+    assert (second['year'] == 2025).all()
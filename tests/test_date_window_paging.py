@@ -0,0 +1,120 @@
+from datetime import date
+
+import pytest
+import requests
+
+import core_functions as core
+import queries as qry
+
+ROW_LIMIT = 10
+
+
+def sales_rows():
+    # Three months; March alone has 25 rows across products 'p00'..'p12'
+    rows = []
+    for month, n_products, variants in ((date(2025, 1, 1), 4, 1), (date(2025, 2, 1), 3, 1), (date(2025, 3, 1), 13, 2)):
+        for product in range(n_products):
+            for variant in range(variants if product else 1):
+                rows.append({'month': month, 'product_title': f"p{product:02d}", 'variant': variant})
+    return rows
+
+
+class FakeShopifyQL:
+    """Serves `sales_rows` like ShopifyQL: ordered by title and cut at the row limit."""
+
+    def __init__(self, rows, row_limit=ROW_LIMIT, timeout_months=0):
+        self.rows = rows
+        self.row_limit = row_limit
+        self.timeout_months = timeout_months
+        self.calls = []
+
+    def __call__(self, start, end, split_from=None):
+        self.calls.append((start, end, split_from))
+        n_months = (end.year - start.year) * 12 + end.month - start.month + 1
+        if n_months > 1 and n_months >= self.timeout_months > 0:
+            raise requests.ReadTimeout('too slow')
+        rows = [row for row in self.rows if start <= row['month'] <= end
+                and (split_from is None or row['product_title'] >= split_from)]
+        rows.sort(key=lambda row: (row['product_title'], row['month'], row['variant']))
+        return {'columns': [], 'rows': rows[:self.row_limit]}
+
+
+def fetched_rows(pages):
+    rows = [(row['month'], row['product_title'], row['variant']) for page in pages for row in page['rows']]
+    assert len(rows) == len(set(rows)), "pages overlap"
+    return sorted(rows)
+
+
+def expected_rows(start, end):
+    return sorted((row['month'], row['product_title'], row['variant']) for row in sales_rows() if start <= row['month'] <= end)
+
+
+def test_plan_month_windows_is_month_aligned():
+    windows = core.plan_month_windows(date(2025, 1, 15), date(2025, 12, 31), 4)
+    assert windows == [
+        (date(2025, 1, 15), date(2025, 4, 30)),
+        (date(2025, 5, 1), date(2025, 8, 31)),
+        (date(2025, 9, 1), date(2025, 12, 31)),
+    ]
+
+
+def test_bisect_month_window():
+    assert core.bisect_month_window((date(2025, 1, 1), date(2025, 3, 31))) == [
+        (date(2025, 1, 1), date(2025, 1, 31)),
+        (date(2025, 2, 1), date(2025, 3, 31)),
+    ]
+    assert core.bisect_month_window((date(2025, 3, 1), date(2025, 3, 31))) is None
+
+
+def test_window_under_the_limit_is_fetched_once():
+    fetch = FakeShopifyQL(sales_rows())
+
+    pages = core.fetch_date_window((date(2025, 1, 1), date(2025, 2, 28)), fetch, ROW_LIMIT, 'product_title')
+
+    assert len(fetch.calls) == 1
+    assert fetched_rows(pages) == expected_rows(date(2025, 1, 1), date(2025, 2, 28))
+
+
+def test_single_month_over_the_limit_is_paged_by_title():
+    fetch = FakeShopifyQL(sales_rows())
+    window = (date(2025, 1, 1), date(2025, 3, 31))
+
+    pages = core.fetch_date_window(window, fetch, ROW_LIMIT, 'product_title')
+
+    assert fetched_rows(pages) == expected_rows(*window)
+    assert len(pages) > 3
+    split_froms = [split_from for _, _, split_from in fetch.calls if split_from is not None]
+    assert split_froms == sorted(split_froms)
+
+
+def test_timed_out_windows_are_bisected():
+    fetch = FakeShopifyQL(sales_rows(), row_limit=1000, timeout_months=2)
+    window = (date(2025, 1, 1), date(2025, 3, 31))
+
+    pages = core.fetch_date_window(window, fetch, 1000)
+
+    assert fetched_rows(pages) == expected_rows(*window)
+    assert len(pages) == 3  # one per month; every wider window timed out
+
+
+def test_single_month_over_the_limit_without_split_column_raises():
+    fetch = FakeShopifyQL(sales_rows())
+
+    with pytest.raises(ValueError, match='row limit'):
+        core.fetch_date_window((date(2025, 3, 1), date(2025, 3, 31)), fetch, ROW_LIMIT)
+
+
+def test_one_value_filling_a_page_raises():
+    rows = [{'month': date(2025, 3, 1), 'product_title': 'same', 'variant': variant} for variant in range(ROW_LIMIT + 1)]
+
+    with pytest.raises(ValueError, match='cannot page further'):
+        core.fetch_date_window((date(2025, 3, 1), date(2025, 3, 31)), FakeShopifyQL(rows), ROW_LIMIT, 'product_title')
+
+
+@pytest.mark.parametrize('value, expected', [
+    ("Kid's Tee", r"'Kid\'s Tee'"),
+    ('Say "hi"', "'Say \"hi\"'"),
+    ('back\\slash', r"'back\\slash'"),
+])
+def test_quote_string(value, expected):
+    assert qry.quote_string(value) == expected
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+import core_functions as core
+
+
+def legacy_weekly_flags(df):
+    """Row-wise rules the weekly flags replaced."""
+    df = df.copy()
+    df['active_weeks'] = df.apply(lambda x : 1 if x['inventory_units_sold']>0 else 0, axis=1)
+    df['inactive_weeks'] = df.apply(lambda x : 1 if ((x['ending_inventory_units']>0) & (x['inventory_units_sold']==0)) else 0, axis=1)
+    df['out_of_stock_weeks'] = df.apply(lambda x : 1 if (x['ending_inventory_units']<0) else 0, axis=1)
+    return df
+
+
+def legacy_channel_flags(df):
+    """Row-wise rule the channel flag replaced."""
+    df = df.copy()
+    df['out_of_stock_sku'] = df.apply(lambda x : 1 if (x['ending_inventory_units']==0) else 0, axis=1)
+    return df
+
+
+@pytest.fixture
+def inventory_df():
+    # Covers sold > 0 / == 0 against ending > 0, == 0 and < 0
+    return pd.DataFrame({
+        'product_variant_sku': ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
+        'inventory_units_sold': np.array([5, 0, 0, 0, 3, 2, 0], dtype=np.int64),
+        'ending_inventory_units': np.array([10, 10, 0, -1, 0, -4, -7], dtype=np.int64),
+    })
+
+
+def test_weekly_flags_match_legacy_rules(inventory_df):
+    expected = legacy_weekly_flags(inventory_df)
+    result = core.add_inventory_flags(inventory_df.copy(), core.WEEKLY_INVENTORY_FLAGS)
+
+    pdt.assert_frame_equal(result, expected)
+    for column in core.WEEKLY_INVENTORY_FLAGS:
+        assert result[column].dtype == np.int64
+
+
+def test_channel_flags_match_legacy_rules(inventory_df):
+    expected = legacy_channel_flags(inventory_df)
+    result = core.add_inventory_flags(inventory_df.copy(), core.CHANNEL_INVENTORY_FLAGS)
+
+    pdt.assert_frame_equal(result, expected)
+    assert result['out_of_stock_sku'].dtype == np.int64
+
+
+def test_negative_and_zero_ending_inventory_are_distinct(inventory_df):
+    result = core.add_inventory_flags(inventory_df.copy(), {**core.WEEKLY_INVENTORY_FLAGS, **core.CHANNEL_INVENTORY_FLAGS})
+    ending = result['ending_inventory_units']
+
+    # Weekly out-of-stock counts negative ending inventory only...
+    assert result.loc[ending < 0, 'out_of_stock_weeks'].eq(1).all()
+    assert result.loc[ending == 0, 'out_of_stock_weeks'].eq(0).all()
+    # ...while the channel flag counts exactly zero only
+    assert result.loc[ending == 0, 'out_of_stock_sku'].eq(1).all()
+    assert result.loc[ending < 0, 'out_of_stock_sku'].eq(0).all()
+
+
+def test_empty_frame_keeps_int64_flags():
+    empty = pd.DataFrame({
+        'inventory_units_sold': np.array([], dtype=np.int64),
+        'ending_inventory_units': np.array([], dtype=np.int64),
+    })
+    result = core.add_inventory_flags(empty, core.WEEKLY_INVENTORY_FLAGS)
+
+    assert list(result.columns[2:]) == list(core.WEEKLY_INVENTORY_FLAGS)
+    assert (result.dtypes[2:] == np.int64).all()
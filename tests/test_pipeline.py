@@ -0,0 +1,99 @@
+import json
+
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from pipeline import Pipeline
+
+
+def build_pipeline(calls):
+    """raw -> clean -> report, plus an independent lookup feeding report."""
+    pipeline = Pipeline('test')
+
+    def stage(name, func):
+        def run(**inputs):
+            calls.append(name)
+            return func(**inputs)
+        return run
+
+    pipeline.add('raw', stage('raw', lambda: pd.DataFrame({'sku': ['a', 'b'], 'units': [1, 2]})))
+    pipeline.add('lookup', stage('lookup', lambda: pd.DataFrame({'sku': ['a', 'b'], 'title': ['A', 'B']})))
+    pipeline.add('clean', stage('clean', lambda raw: raw.assign(units=raw['units'] * 10)), inputs=['raw'])
+    pipeline.add('report', stage('report', lambda clean, lookup: clean.merge(lookup, on='sku')), inputs=['clean', 'lookup'])
+    return pipeline
+
+
+def test_run_computes_every_stage_once():
+    calls = []
+
+    run = build_pipeline(calls).run()
+
+    assert sorted(calls) == ['clean', 'lookup', 'raw', 'report']
+    assert run.outputs['report']['units'].tolist() == [10, 20]
+
+
+def test_targets_only_run_their_dependencies():
+    calls = []
+
+    build_pipeline(calls).run(['clean'])
+
+    assert sorted(calls) == ['clean', 'raw']
+
+
+def test_run_dir_reuses_every_stage(tmp_path):
+    first = build_pipeline([]).run(run_dir=tmp_path)
+    calls = []
+
+    second = build_pipeline(calls).run(run_dir=tmp_path)
+
+    assert calls == []
+    pdt.assert_frame_equal(second.outputs['report'], first.outputs['report'])
+    metrics = json.loads((tmp_path / 'stages.json').read_text())
+    assert all(metrics[name]['reused'] for name in ('raw', 'lookup', 'clean', 'report'))
+
+
+def test_rerun_recomputes_the_stage_and_its_dependents_only(tmp_path):
+    build_pipeline([]).run(run_dir=tmp_path)
+    calls = []
+
+    run = build_pipeline(calls).run(run_dir=tmp_path, rerun=['clean'])
+
+    # raw is reused from run_dir as clean's input; lookup is reused by report
+    assert sorted(calls) == ['clean', 'report']
+    assert sorted(run.ran) == ['clean', 'report']
+
+
+def test_rerun_of_a_leaf_does_not_load_unneeded_inputs(tmp_path):
+    build_pipeline([]).run(run_dir=tmp_path)
+    (tmp_path / 'raw.parquet').unlink()
+    calls = []
+
+    build_pipeline(calls).run(['report'], run_dir=tmp_path, rerun=['report'])
+
+    # clean is reusable, so raw is neither loaded nor recomputed
+    assert calls == ['report']
+
+
+def test_missing_outputs_are_recomputed(tmp_path):
+    build_pipeline([]).run(run_dir=tmp_path)
+    (tmp_path / 'lookup.parquet').unlink()
+    calls = []
+
+    build_pipeline(calls).run(run_dir=tmp_path)
+
+    assert calls == ['lookup']
+
+
+def test_unknown_rerun_stage_raises():
+    with pytest.raises(ValueError, match='Unknown stage'):
+        build_pipeline([]).run(rerun=['nope'])
+
+
+def test_cycles_are_rejected():
+    pipeline = Pipeline('cyclic')
+    pipeline.add('a', lambda b: b, inputs=['b'])
+    pipeline.add('b', lambda a: a, inputs=['a'])
+
+    with pytest.raises(ValueError, match='Cycle'):
+        pipeline.run(['a'])
@@ -0,0 +1,56 @@
+import datetime
+
+import pytest
+
+import access_functions as af
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return af.ShopifyQLCache(tmp_path, relative_ttl=900)
+
+
+def closed_window_query(until):
+    return f"FROM sales SHOW net_sales GROUP BY month SINCE 2024-01-01 UNTIL {until.isoformat()}"
+
+
+@pytest.mark.parametrize('query', [
+    "FROM sales SHOW net_sales SINCE startOfDay(-14d) UNTIL today",
+    "FROM sales SHOW net_sales SINCE -3m UNTIL yesterday",
+    "FROM sales SHOW net_sales DURING last_year",
+    "FROM sales SHOW net_sales GROUP BY week",
+])
+def test_relative_or_open_windows_expire(cache, query):
+    assert cache.ttl_for(query) == 900
+
+
+def test_closed_past_window_never_expires(cache):
+    assert cache.ttl_for(closed_window_query(datetime.date.today() - datetime.timedelta(days=1))) is None
+
+
+def test_window_ending_today_or_later_expires(cache):
+    assert cache.ttl_for(closed_window_query(datetime.date.today())) == 900
+    assert cache.ttl_for(closed_window_query(datetime.date.today() + datetime.timedelta(days=30))) == 900
+
+
+def test_relative_dates_win_over_a_past_until(cache):
+    query = "FROM sales SHOW net_sales SINCE startOfMonth(-12m) UNTIL 2024-01-31"
+    assert cache.ttl_for(query) == 900
+
+
+def test_entries_round_trip_and_expire(cache, monkeypatch):
+    query = "FROM sales SHOW net_sales SINCE -14d UNTIL today"
+    table_data = {'columns': [], 'rows': [{'net_sales': '1.0'}]}
+    now = 1_000_000.0
+    monkeypatch.setattr(af.time, 'time', lambda: now)
+
+    cache.put(query, table_data)
+    assert cache.get(query) == table_data
+
+    now += 901
+    assert cache.get(query) is None
+
+
+def test_cache_key_ignores_whitespace(cache):
+    cache.put("FROM sales  SHOW net_sales\n UNTIL 2024-01-31", {'rows': []})
+    assert cache.get("FROM sales SHOW net_sales UNTIL 2024-01-31") == {'rows': []}
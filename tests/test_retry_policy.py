@@ -0,0 +1,136 @@
+import pytest
+import requests
+
+import access_functions as af
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data or {}
+        self.headers = headers or {}
+        self.text = str(self._data)
+
+    def json(self):
+        return self._data
+
+
+class FakeClient:
+    """Returns the queued responses (or raises the queued exceptions) in order."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def ok_response(rows=()):
+    return FakeResponse(data={'data': {'shopifyqlQuery': {'tableData': {'columns': [], 'rows': list(rows)}, 'parseErrors': None}}})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(af.time, 'sleep', slept.append)
+    monkeypatch.setattr(af, 'query_scheduler', af.QueryCostScheduler())
+    return slept
+
+
+@pytest.fixture
+def policy():
+    return af.RetryPolicy(max_attempts=4, base_delay=1, max_delay=8, max_elapsed=600)
+
+
+@pytest.mark.parametrize('status_code, data, expected', [
+    (200, {'data': {}}, None),
+    (429, None, af.RetryPolicy.THROTTLED),
+    (200, {'errors': [{'extensions': {'code': 'THROTTLED'}}]}, af.RetryPolicy.THROTTLED),
+    (502, None, af.RetryPolicy.SERVER_ERROR),
+    (200, {'errors': [{'extensions': {'code': 'INTERNAL_SERVER_ERROR'}}]}, af.RetryPolicy.SERVER_ERROR),
+    (401, None, af.RetryPolicy.PERMANENT),
+    (404, None, af.RetryPolicy.PERMANENT),
+])
+def test_classify_response(policy, status_code, data, expected):
+    assert policy.classify_response(FakeResponse(status_code, data), data) == expected
+
+
+@pytest.mark.parametrize('exc, expected', [
+    (requests.ConnectionError('reset'), af.RetryPolicy.NETWORK),
+    (requests.ConnectTimeout('connect'), af.RetryPolicy.NETWORK),
+    (requests.ReadTimeout('read'), af.RetryPolicy.PERMANENT),
+    (ValueError('bad'), af.RetryPolicy.PERMANENT),
+])
+def test_classify_exception(policy, exc, expected):
+    assert policy.classify_exception(exc) == expected
+
+
+def test_delay_is_capped_and_honours_retry_after(policy):
+    for attempt in range(1, 10):
+        assert 0 <= policy.delay(attempt) <= policy.max_delay
+    assert policy.delay(1, retry_after=30) == 30
+    assert policy.delay(1, minimum=5) >= 5
+
+
+def test_should_retry_stops_on_permanent_attempts_and_elapsed(policy):
+    assert policy.should_retry(policy.THROTTLED, 1, 0, 1)
+    assert not policy.should_retry(policy.PERMANENT, 1, 0, 1)
+    assert not policy.should_retry(policy.NETWORK, policy.max_attempts, 0, 1)
+    assert not policy.should_retry(policy.SERVER_ERROR, 1, 599, 2)
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({'Retry-After': '7'}, 7.0),
+    ({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}, None),
+    ({}, None),
+])
+def test_retry_after_header(headers, expected):
+    assert af._retry_after(FakeResponse(429, headers=headers)) == expected
+
+
+def test_throttled_query_waits_for_retry_after(sleeps, policy):
+    client = FakeClient([FakeResponse(429, headers={'Retry-After': '12'}), ok_response([{'a': 1}])])
+    stats = {}
+
+    table_data = af.run_shopifyQL_query('FROM sales SHOW net_sales', 'token', client=client, policy=policy, stats=stats)
+
+    assert table_data['rows'] == [{'a': 1}]
+    assert client.calls == 2
+    assert sleeps == [12.0]
+    assert stats['attempts'] == 2
+    assert stats['retries'] == {policy.THROTTLED: 1}
+
+
+def test_network_errors_are_retried_until_max_attempts(sleeps, policy):
+    client = FakeClient([requests.ConnectionError('reset')] * policy.max_attempts)
+
+    with pytest.raises(requests.ConnectionError):
+        af.run_shopifyQL_query('FROM sales SHOW net_sales', 'token', client=client, policy=policy)
+
+    assert client.calls == policy.max_attempts
+    assert len(sleeps) == policy.max_attempts - 1
+
+
+def test_read_timeouts_are_not_retried(sleeps, policy):
+    client = FakeClient([requests.ReadTimeout('read'), ok_response()])
+
+    with pytest.raises(requests.ReadTimeout):
+        af.run_shopifyQL_query('FROM sales SHOW net_sales', 'token', client=client, policy=policy)
+
+    assert client.calls == 1
+    assert sleeps == []
+
+
+def test_permanent_failures_raise_without_retrying(sleeps, policy):
+    client = FakeClient([FakeResponse(401, data={'errors': 'unauthorized'})])
+
+    with pytest.raises(Exception, match='GraphQL query failed'):
+        af.run_shopifyQL_query('FROM sales SHOW net_sales', 'token', client=client, policy=policy)
+
+    assert client.calls == 1
+    assert sleeps == []
@@ -1,26 +1,36 @@
 import os
 import argparse
 import logging
-import pandas as pd
+import shutil
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 import shopify
-from operator import itemgetter
-from access_functions import get_access_token_oauth, connect_to_shopify, run_shopifyQL_query
+from access_functions import HTTP_POOL_SIZE, get_access_token_oauth, configure_http_client, configure_query_cache, connect_to_shopify, run_shopifyQL_query, query_fingerprint
 import core_functions as core
 import queries as qry
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-import time
 
 load_dotenv()
 
 SHOP_URL = os.getenv("SHOP_URL")
+WEEKLY_TABLE = core.WEEKLY_INVENTORY_TABLE
+SKU_BATCH_SIZE = int(os.getenv("SHOPIFYQL_SKU_BATCH_SIZE", "18"))
+SKU_MAX_BATCH_SIZE = int(os.getenv("SHOPIFYQL_SKU_MAX_BATCH_SIZE", "250"))
 logger = logging.getLogger(__name__)
 
 ## Six-Month window dates
 today = datetime.today().date()
 
+# One rolling window of 52 weeks ending yesterday drives the full query,
+# the incremental queries and the rows incremental merges age out. The
+# window starts on a Monday; the cutoff keeps a first bucket labelled up to
+# six days earlier, in case the shop's weeks start on another weekday
+WEEKLY_WINDOW_END = today - relativedelta(days=1)
+WEEKLY_WINDOW_START = WEEKLY_WINDOW_END - relativedelta(weeks=51, days=WEEKLY_WINDOW_END.weekday())
+WEEKLY_RETENTION_CUTOFF = WEEKLY_WINDOW_START - relativedelta(days=6)
+
 ## Splitting Data into Three 4-Month Periods
 # start_date = (today - relativedelta(months=12)).replace(day=1)
 # end_date = (first_st_date + relativedelta(months=4)).replace(day=1) - relativedelta(days=1)
@@ -29,8 +39,21 @@ today = datetime.today().date()
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--output", choices=["bigquery", "csv"], default="bigquery")
+    parser.add_argument("--output", choices=["bigquery", "csv", "parquet"], default="bigquery")
     parser.add_argument("--csv-dir", default="output")
+    parser.add_argument("--parquet-dir", default="output")
+    parser.add_argument("--parquet-compression", choices=["snappy", "zstd", "gzip", "brotli", "none"], default="zstd")
+    parser.add_argument("--row-group-size", type=int, default=None, help="Max rows per Parquet row group")
+    parser.add_argument("--partition-by", choices=["month", "week"], default=None, help="Write a hive-style Parquet dataset partitioned by period")
+    parser.add_argument("--http-timeout", type=float, default=300, help="Read timeout in seconds for Shopify requests")
+    parser.add_argument("--cache-dir", default=None, help="Cache ShopifyQL responses on disk here")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Max SKU batches queried concurrently")
+    parser.add_argument("--batch-size", type=int, default=SKU_BATCH_SIZE, help="SKUs in the first batches; later batches are sized from observed responses")
+    parser.add_argument("--max-batch-size", type=int, default=SKU_MAX_BATCH_SIZE, help="Upper bound for adaptive SKU batches")
+    parser.add_argument("--incremental", action="store_true", help="Only fetch weeks from each SKU's latest stored week, merge them in and age out weeks before the rolling 52-week window")
+    parser.add_argument("--spill-dir", default=None, help="Spill fetched batches to Parquet here instead of holding them in memory")
+    parser.add_argument("--checkpoint-dir", default=None, help="Checkpoint finished batches here so a failed run can be resumed")
+    parser.add_argument("--run-id", default=today.isoformat(), help="Checkpoint run to resume (default: today's date)")
     return parser.parse_args()
 
 
@@ -46,55 +69,79 @@ def setup_logging(log_path="logs/one_time_run.log"):
     )
 
 
-def get_inventory_sold_df(table_data):
+INVENTORY_SOLD_COLUMNS = [
+    ('product_title', 'product_title', 'category'),
+    ('product_variant_title', 'product_variant', 'category'),
+    ('product_variant_sku', 'product_variant_sku', 'category'),
+    ('inventory_units_sold', 'inventory_sold_last_14days', 'int'),
+    ('ending_inventory_units', 'current_available_inventory_units', 'int'),
+]
 
-        product_title = list(map(itemgetter('product_title'), table_data['rows']))
-        product_variant_title = list(map(itemgetter('product_variant_title'), table_data['rows']))
-        product_variant_sku = list(map(itemgetter('product_variant_sku'), table_data['rows']))
-        inventory_units_sold = list(map(itemgetter('inventory_units_sold'), table_data['rows']))
-        ending_inventory_units = list(map(itemgetter('ending_inventory_units'), table_data['rows']))
+INVENTORY_WEEKLY_RAW_COLUMNS = [
+    ('product_variant_sku', 'product_variant_sku', 'category'),
+    ('week', 'week', 'date'),
+    ('inventory_units_sold', 'inventory_units_sold', 'int'),
+    ('ending_inventory_units', 'ending_inventory_units', 'int'),
+]
 
-        inventory_dict = {'product_title': product_title,
-                        'product_variant': product_variant_title,
-                        'product_variant_sku': product_variant_sku,
-                        'inventory_sold_last_14days': inventory_units_sold,
-                        'current_available_inventory_units': ending_inventory_units}
-        inventory_df = pd.DataFrame(inventory_dict)
 
-        inventory_df['inventory_sold_last_14days']=inventory_df['inventory_sold_last_14days'].astype(int)
-        inventory_df['current_available_inventory_units']=inventory_df['current_available_inventory_units'].astype(int)
-        inventory_df = inventory_df.reset_index(drop=True)
+def get_inventory_sold_df(table_data):
 
-        return inventory_df
+        return core.decode_table_data(table_data, INVENTORY_SOLD_COLUMNS)
 
 
 def get_inventory_weekly_raw_df(table_data):
 
-        product_variant_sku = list(map(itemgetter('product_variant_sku'), table_data['rows']))
-        week = list(map(itemgetter('week'), table_data['rows']))
-        inventory_units_sold = list(map(itemgetter('inventory_units_sold'), table_data['rows']))
-        ending_inventory_units = list(map(itemgetter('ending_inventory_units'), table_data['rows']))
+        inventory_weekly_df = core.decode_table_data(table_data, INVENTORY_WEEKLY_RAW_COLUMNS)
 
-        inventory_weekly_dict = {'product_variant_sku': product_variant_sku,
-                        'week': week,
-                        'inventory_units_sold': inventory_units_sold,
-                        'ending_inventory_units': ending_inventory_units}
-        inventory_weekly_df = pd.DataFrame(inventory_weekly_dict)
+        return core.add_inventory_flags(inventory_weekly_df, core.WEEKLY_INVENTORY_FLAGS)
 
-        inventory_weekly_df['week']=pd.to_datetime(inventory_weekly_df['week']).dt.date
-        inventory_weekly_df['inventory_units_sold']=inventory_weekly_df['inventory_units_sold'].astype(int)
-        inventory_weekly_df['ending_inventory_units']=inventory_weekly_df['ending_inventory_units'].astype(int)        
-        inventory_weekly_df['active_weeks'] = inventory_weekly_df.apply(lambda x : 1 if x['inventory_units_sold']>0 else 0, axis=1)
-        inventory_weekly_df['inactive_weeks'] = inventory_weekly_df.apply(lambda x : 1 if ((x['ending_inventory_units']>0) & (x['inventory_units_sold']==0)) else 0, axis=1)
-        inventory_weekly_df['out_of_stock_weeks'] = inventory_weekly_df.apply(lambda x : 1 if (x['ending_inventory_units']<0) else 0, axis=1)
 
-        inventory_weekly_df = inventory_weekly_df.reset_index(drop=True)
-
-        return inventory_weekly_df
+def add_product_columns(inventory_weekly_df, products_df):
+        """
+        Attach product title and variant to weekly rows and order the output columns.
+        """
+        final_df = core.identifiers.unify(inventory_weekly_df).merge(products_df, how='left', on='product_variant_sku')
+        final_df = final_df[['product_title', 'product_variant', 'product_variant_sku', 'week', 'inventory_units_sold',
+                            'ending_inventory_units', 'active_weeks', 'inactive_weeks', 'out_of_stock_weeks']].reset_index(drop=True)
+        return final_df
 
 
-def main(access_token=None):
-    """Main function to pull and analyze inventory data"""
+def iter_output_chunks(collector, products_df, cleanup_dir=None):
+        """
+        Yield the collected batches one at a time as output frames.
+
+        `cleanup_dir` is removed once the generator is exhausted or closed.
+        """
+        try:
+            for chunk in collector:
+                yield add_product_columns(chunk, products_df)
+        finally:
+            if cleanup_dir:
+                shutil.rmtree(cleanup_dir, ignore_errors=True)
+
+
+def weekly_query_hash(since):
+        """Fingerprint of the weekly query for a watermark group, independent of its SKUs."""
+        return query_fingerprint(qry.get_all_sku_weekly_inventory_query(('<sku>',), since, WEEKLY_WINDOW_END))
+
+
+def main(access_token=None, max_in_flight=1, spill_dir=None, incremental=False, as_chunks=False, checkpoint=None,
+         batch_size=SKU_BATCH_SIZE, max_batch_size=SKU_MAX_BATCH_SIZE):
+    """
+    Main function to pull and analyze inventory data
+
+    With `as_chunks`, returns a generator of per-batch output frames instead
+    of one concatenated DataFrame, so the caller can stream them out. The
+    batches are then spilled to Parquet as they arrive (to a temporary
+    directory unless `spill_dir` or `checkpoint` is given) and read back one
+    at a time, so memory stays bounded by a single batch.
+    With a `core.CheckpointStore`, finished batches are checkpointed there
+    and SKUs already fetched by an earlier attempt are skipped.
+    SKU batches start at `batch_size` and are resized from the cost,
+    latency and row count of earlier responses, up to `max_batch_size`.
+    """
+    temp_spill_dir = None
     try:
         # Connect to Shopify
         connect_to_shopify(access_token)
@@ -107,31 +154,70 @@ def main(access_token=None):
 
         inventory_sold_df_merge = inventory_sold_df[['product_title','product_variant','product_variant_sku']].drop_duplicates().reset_index(drop=True)
 
-        skus = inventory_sold_df['product_variant_sku'].unique()
-        skus.sort()
-        skus_sorted = tuple(skus)
+        skus_sorted = tuple(sorted(inventory_sold_df['product_variant_sku'].unique()))
 
         ##### Get inventory data
 
-        final_df = pd.DataFrame()
-
-        for i in range(0, len(skus_sorted), 18):
-            batch = skus_sorted[i:i+18]
-            inventory_weekly_query = qry.get_all_sku_weekly_inventory_query(batch)
-            inventory_weekly_data = run_shopifyQL_query(inventory_weekly_query, access_token)            
-            print("sleeping for 10 secs")
-            time.sleep(10)    
-            inventory_weekly_raw_df = get_inventory_weekly_raw_df(inventory_weekly_data)
-            final_df = pd.concat([final_df, inventory_weekly_raw_df], ignore_index=True)
-            print(final_df.shape, inventory_weekly_raw_df.shape)      
-        
-        final_df = final_df.merge(inventory_sold_df_merge, how='left', on='product_variant_sku')
-        final_df = final_df[['product_title', 'product_variant', 'product_variant_sku', 'week', 'inventory_units_sold',
-                            'ending_inventory_units', 'active_weeks', 'inactive_weeks', 'out_of_stock_weeks']].reset_index(drop=True)
+        if as_chunks and checkpoint is None and spill_dir is None:
+            # Chunks are only read back once every batch is in, so keep
+            # them on disk rather than holding the whole load in memory
+            spill_dir = temp_spill_dir = tempfile.mkdtemp(prefix="weekly_load_")
+        collector = checkpoint if checkpoint is not None else core.ChunkCollector(spill_dir=spill_dir)
+
+        # Incremental mode refetches each SKU from its latest stored week
+        # (which may have been partial), so batches are grouped by watermark.
+        # SKUs without one, and full loads, start at the window start
+        watermarks = core.get_weekly_watermarks(WEEKLY_TABLE) if incremental else {}
+        sku_since = {sku: max(watermarks.get(sku, WEEKLY_WINDOW_START), WEEKLY_WINDOW_START) for sku in skus_sorted}
+        skus_by_since = {}
+        for sku in skus_sorted:
+            skus_by_since.setdefault(sku_since[sku], []).append(sku)
+
+        # Batch boundaries change with adaptive sizing, so checkpoints are
+        # matched per SKU against the query of the SKU's watermark group
+        group_hashes = {since: weekly_query_hash(since) for since in skus_by_since}
+        if checkpoint is not None:
+            checkpoint.discard(key for key, entry in checkpoint.batches.items()
+                               if any(group_hashes.get(sku_since.get(sku)) != entry['query_hash'] for sku in entry['items']))
+            for since, since_skus in skus_by_since.items():
+                done_skus = checkpoint.completed_items(group_hashes[since])
+                skus_by_since[since] = [sku for sku in since_skus if sku not in done_skus]
+            logger.info("Resuming with %s of %s SKUs left", sum(map(len, skus_by_since.values())), len(skus_sorted))
+        logger.info("Fetching %s SKUs in %s watermark group(s)", sum(map(len, skus_by_since.values())), len(skus_by_since))
+
+        sku_position = {sku: i for i, sku in enumerate(skus_sorted)}
+
+        def store_batch(batch, inventory_weekly_raw_df):
+            if checkpoint is not None:
+                checkpoint.add(inventory_weekly_raw_df, key=batch[0], query_hash=group_hashes[sku_since[batch[0]]], items=batch)
+            else:
+                collector.add(inventory_weekly_raw_df, key=sku_position[batch[0]])
+            logger.info("Batch of %s SKUs from %s rows: %s", len(batch), batch[0], inventory_weekly_raw_df.shape)
+
+        for since, since_skus in skus_by_since.items():
+            # Each watermark group gets its own sizing, since rows per SKU
+            # depend on how many weeks are fetched
+            batcher = core.AdaptiveBatcher(batch_size, max_size=max_batch_size)
+
+            def fetch_batch(batch, since=since):
+                stats = {}
+                inventory_weekly_query = qry.get_all_sku_weekly_inventory_query(batch, since, WEEKLY_WINDOW_END)
+                inventory_weekly_data = run_shopifyQL_query(inventory_weekly_query, access_token, stats=stats)
+                return get_inventory_weekly_raw_df(inventory_weekly_data), stats
+
+            core.execute_adaptive_batches(since_skus, fetch_batch, batcher, store_batch, max_workers=max_in_flight)
+
+        products_df = core.identifiers.unify(inventory_sold_df_merge)
+        if as_chunks:
+            return iter_output_chunks(collector, products_df, cleanup_dir=temp_spill_dir)
+
+        final_df = add_product_columns(collector.to_frame(), products_df)
         return final_df
 
     except Exception as e:
         logger.exception("Error in main: %s", str(e))
+        if temp_spill_dir:
+            shutil.rmtree(temp_spill_dir, ignore_errors=True)
         raise
     finally:
         # Clear the session
@@ -144,11 +230,19 @@ if __name__ == "__main__":
     setup_logging()
 
     args = parse_args()
+    configure_http_client(read_timeout=args.http_timeout, pool_size=max(HTTP_POOL_SIZE, args.max_in_flight))
+    if args.cache_dir:
+        configure_query_cache(args.cache_dir)
     # Step 1: Get Access Token
     access_token = get_access_token_oauth(SHOP_URL)
     
     # Step 2: Call Main Function
-    df = main(access_token)
+    # Full BigQuery loads stream batch frames out instead of building one DataFrame
+    stream = args.output == "bigquery" and not args.incremental
+    checkpoint = core.CheckpointStore(args.checkpoint_dir, args.run_id) if args.checkpoint_dir else None
+    df = main(access_token, max_in_flight=args.max_in_flight, spill_dir=args.spill_dir,
+              incremental=args.incremental, as_chunks=stream, checkpoint=checkpoint,
+              batch_size=args.batch_size, max_batch_size=args.max_batch_size)
 
     '''
     NOTE: 
@@ -158,8 +252,18 @@ if __name__ == "__main__":
     '''
     # Step 3: Load Data to BigQuery
     if args.output == "bigquery":
-        core.load_bigquery_table(df, 'all_sku_weekly_inventory_data')
-        pass
+        if args.incremental:
+            core.merge_bigquery_table(df, WEEKLY_TABLE, ['product_variant_sku', 'week'],
+                                      delete_before=('week', WEEKLY_RETENTION_CUTOFF))
+        else:
+            core.stream_bigquery_table(df, WEEKLY_TABLE)
+        core.refresh_sku_weekly_agg()
+    elif args.output == "parquet":
+        core.write_parquet_table(df, args.parquet_dir, 'all_sku_weekly_inventory_data',
+                                 compression=args.parquet_compression, row_group_size=args.row_group_size,
+                                 partition_by=args.partition_by, date_column='week')
     else:
         os.makedirs(args.csv_dir, exist_ok=True)
         df.to_csv(os.path.join(args.csv_dir, "all_sku_weekly_inventory_data.csv"), index=False)
+    if checkpoint is not None:
+        checkpoint.commit()